@@ -0,0 +1,51 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """Lets ReplicaRouter send the reads of safe requests to a replica."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _use_replica.set(request.method in SAFE_METHODS)
+            try:
+                return await get_response(request)
+            finally:
+                _use_replica.reset(token)
+
+        return middleware
+
+    def middleware(request):
+        token = _use_replica.set(request.method in SAFE_METHODS)
+        try:
+            return get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+    return middleware
+
+
+class ReplicaRouter:
+    """Reads of safe requests go to a random replica, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -58,16 +58,68 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+ASGI_APPLICATION = 'core.asgi.application'
+
+if os.getenv('DATABASE_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME', 'todo'),
+            'USER': os.getenv('DATABASE_USER', ''),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', ''),
+            'PORT': os.getenv('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+    if os.getenv('DATABASE_POOL_SIZE'):
+        # psycopg connection pool, which Django only allows without persistent connections
+        DATABASES['default'].update(CONN_MAX_AGE=0, OPTIONS={
+            'pool': {'min_size': 1, 'max_size': int(os.getenv('DATABASE_POOL_SIZE'))},
+        })
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            # in-memory test databases raise "table is locked" instead of waiting on concurrent writers
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+    if os.getenv('SQLITE_TUNING', 'True') == 'True':
+        # WAL lets readers run alongside the single writer, IMMEDIATE takes the write lock up front instead of
+        # failing with "database is locked" when a read transaction later tries to write
+        DATABASES['default']['OPTIONS'] = {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        }
+
+# read replicas of the default database, used for GET, HEAD and OPTIONS requests
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.getenv('DATABASE_REPLICA_HOSTS', '').split(','))):
+    DATABASE_REPLICAS.append(f'replica{index}')
+    DATABASES[f'replica{index}'] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+    MIDDLEWARE.append('core.db.replica_middleware')
 
 AUTH_PASSWORD_VALIDATORS = []
 
+# the first hasher makes new hashes, the others verify older ones, which are rehashed with the first on login
+PASSWORD_HASHERS = [
+    'users.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if os.getenv('PASSWORD_HASHER'):
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(PASSWORD_HASHERS.index(os.getenv('PASSWORD_HASHER'))))
+# work factor of users.hashers.PBKDF2PasswordHasher, Django's default when unset
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 0))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Asia/Dhaka'
 USE_I18N = True
@@ -78,6 +130,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'todo': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'todo',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('TODO_CACHE_MAX_ENTRIES', 10000))},
+    },
+}
+if os.getenv('TODO_CACHE_URL'):
+    CACHES['todo'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('TODO_CACHE_URL'),
+        'TIMEOUT': 300,
+    }
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.User'
 
@@ -85,15 +155,53 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 50
 }
+if os.getenv('FAST_JSON_RENDERER') == 'True':
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'todo.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'users.serializers.TokenVerifySerializer',
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# the in-memory layer only reaches consumers of its own process, processes share the Redis one of REDIS_URL
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': os.getenv('CHANNEL_LAYER_BACKEND', 'channels_redis.core.RedisChannelLayer' if os.getenv('REDIS_URL')
+                             else 'channels.layers.InMemoryChannelLayer'),
+    }
+}
+if os.getenv('REDIS_URL'):
+    CHANNEL_LAYERS['default']['CONFIG'] = {'hosts': [os.getenv('REDIS_URL')]}
+
+# Users settings
+
+# seconds a user's active and staff flags are trusted before StatelessJWTAuthentication checks them again
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 60))
+# verified tokens remembered by /api/token/verify/
+TOKEN_VERIFY_CACHE_SIZE = int(os.getenv('TOKEN_VERIFY_CACHE_SIZE', 10000))
+# threads hashing passwords for the async signup and login views
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 4))
+
+# ToDo settings
+
+CHANGE_TOMBSTONE_RETENTION_DAYS = int(os.getenv('CHANGE_TOMBSTONE_RETENTION_DAYS', 30))
+TODO_CACHE_ALIAS = 'todo'
+# dotted path of the search backend, by default the indexed one of the database, see todo.search.get_backend
+TODO_SEARCH_BACKEND = os.getenv('TODO_SEARCH_BACKEND')
+# Postgres text search configuration of the search index
+TODO_SEARCH_CONFIG = os.getenv('TODO_SEARCH_CONFIG', 'english')
+# rows per iterator() chunk of an account export and per bulk_create of an import
+ACCOUNT_TRANSFER_CHUNK_SIZE = int(os.getenv('ACCOUNT_TRANSFER_CHUNK_SIZE', 2000))
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Change, Project, Tag, Task, Shared
+from .models import Change, ChangeCounter, Project, Tag, Task, Shared
 
 
 @admin.register(Change)
@@ -8,6 +8,11 @@ class ChangeAdmin(admin.ModelAdmin):
     list_display = ('id', 'owner', 'action', 'change_id', 'content_type', 'object_id')
 
 
+@admin.register(ChangeCounter)
+class ChangeCounterAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'last_id')
+
+
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ('title', 'owner', 'deadline_date', 'deadline_time', 'created_at', 'updated_at')
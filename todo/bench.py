@@ -0,0 +1,100 @@
+import math
+import time
+from datetime import timedelta
+from itertools import cycle
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import Change, Project, Shared, Tag, Task, TaskCounter, TaskVisibility
+from .search import get_backend
+
+SEED_CHUNK_SIZE = 10000
+
+
+def seed_tasks(user, count, projects=10, tags=10, tags_per_task=2):
+    """
+    Create ``count`` tasks spread over projects and tags for ``user``, bypassing the signals. A third of the
+    deadlines have passed, every tenth task recurs daily and every fourth has a reminder, and the schedule fields
+    are computed as ``save()`` computes them, so the due, overdue and scheduler queries find rows.
+    """
+    now = timezone.now()
+    project_objs = Project.objects.bulk_create(
+        [Project(owner=user, title=f'{user.pk}-project-{i}', description='benchmark') for i in range(projects)])
+    tag_objs = Tag.objects.bulk_create([Tag(owner=user, title=f'{user.pk}-tag-{i}') for i in range(tags)])
+    # inserted in chunks, so seeding large accounts does not hold every task in memory
+    for start in range(0, count, SEED_CHUNK_SIZE):
+        task_objs = [
+            Task(owner=user, title=f'task {i}', description='benchmark task', project=project_objs[i % projects],
+                 priority=i % 5 + 1, completed=i % 3 == 0,
+                 deadline_date=(now + timedelta(days=i % 30 - 10)).date(),
+                 occurrence_minutes=24 * 60 if i % 10 == 0 else None,
+                 last_occurrence=now - timedelta(hours=i % 48), reminder_minutes=60 if i % 4 == 0 else None)
+            for i in range(start, min(start + SEED_CHUNK_SIZE, count))
+        ]
+        for task in task_objs:
+            task.refresh_schedule(now)
+        Task.objects.bulk_create(task_objs, batch_size=1000)
+        Task.tags.through.objects.bulk_create([
+            Task.tags.through(task_id=task.pk, tag_id=tag_objs[(i + j) % tags].pk)
+            for i, task in enumerate(task_objs, start) for j in range(min(tags_per_task, tags))
+        ], batch_size=1000)
+
+
+def timed(func, repeat=5):
+    """Run ``func`` ``repeat`` times and return the wall time of each run in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def seed_dataset(prefix, users, tasks, projects=10, tags=10, shares=2, changes=0, password=None, subtasks=20):
+    """
+    Create ``users`` users named ``<prefix>-<n>`` with the given number of projects, tags and tasks each (see
+    ``seed_tasks``), bypassing the signals. Each user then shares ``shares`` projects and tags with the next user and
+    gets a ``changes`` long change history, ``subtasks`` children under their first task, task counters, search index
+    entries and the visibility rows of the shares. All users get ``password``, hashed once.
+    """
+    User = get_user_model()
+    password = make_password(password)
+    user_objs = User.objects.bulk_create(
+        [User(username=f'{prefix}-{i}', password=password, is_active=True) for i in range(users)])
+    for user in user_objs:
+        seed_tasks(user, tasks, projects, tags)
+        task_ids = list(Task.objects.filter(owner=user).order_by('id').values_list('id', flat=True))
+        if task_ids:
+            Task.objects.filter(id__in=task_ids[1:subtasks + 1]).update(parent=task_ids[0])
+        objects = [(Change.PROJECT, pk) for pk in Project.objects.filter(owner=user).values_list('id', flat=True)]
+        objects += [(Change.TAG, pk) for pk in Tag.objects.filter(owner=user).values_list('id', flat=True)]
+        objects += [(Change.TASK, pk) for pk in task_ids]
+        entries = [(Change.CREATED, content_type, pk) for content_type, pk in objects[:changes]]
+        if task_ids:
+            updated = cycle(task_ids)
+            entries += [(Change.UPDATED, Change.TASK, next(updated)) for _ in range(changes - len(entries))]
+        for start in range(0, len(entries), SEED_CHUNK_SIZE):
+            Change.objects.record_many(user, entries[start:start + SEED_CHUNK_SIZE], notify=False)
+        TaskCounter.objects.rebuild(user)
+        for start in range(0, len(task_ids), SEED_CHUNK_SIZE):
+            get_backend().index(Task.objects.filter(id__in=task_ids[start:start + SEED_CHUNK_SIZE]))
+        get_backend().index(Project.objects.filter(owner=user))
+    for user, shared_with in zip(user_objs, user_objs[1:] + user_objs[:1]):
+        if shared_with == user:
+            continue
+        Shared.objects.bulk_create(
+            [Shared(owner=user, shared_with=shared_with, content_type=Shared.PROJECT, object_id=str(pk))
+             for pk in Project.objects.filter(owner=user).order_by('id').values_list('id', flat=True)[:shares]] +
+            [Shared(owner=user, shared_with=shared_with, content_type=Shared.TAG, object_id=str(pk))
+             for pk in Tag.objects.filter(owner=user).order_by('id').values_list('id', flat=True)[:shares]])
+    for user in user_objs:
+        TaskVisibility.objects.refresh_user(user)
+    return user_objs
+
+
+def percentile(values, q):
+    """The nearest-rank ``q`` percentile of ``values``."""
+    values = sorted(values)
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)] if values else None
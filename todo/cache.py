@@ -0,0 +1,47 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cache():
+    return caches[settings.TODO_CACHE_ALIAS]
+
+
+def make_key(user_id, change_id, endpoint, *parts):
+    """
+    Key of a cached response. Keys are namespaced by the user's last change id, every recorded change moves the
+    user to a fresh namespace and the stale entries age out of the backend.
+    """
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'todo:{user_id}:{change_id}:{endpoint}:{digest}'
+
+
+def get(key):
+    value = get_cache().get(key)
+    _count('misses' if value is None else 'hits')
+    return value
+
+
+def set(key, value):
+    get_cache().set(key, value)
+
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
@@ -0,0 +1,82 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .models import Change, Shared, TaskVisibility
+
+
+def user_group(user_id):
+    return f'changes-{user_id}'
+
+
+class ChangeConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.group_name = user_group(user.pk)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def change_recorded(self, event):
+        await self.send_json(event['change'])
+
+    async def reminder_due(self, event):
+        await self.send_json(event['reminder'])
+
+
+def change_recipients(changes):
+    """
+    Map each change to its owner, its ``recipients`` and the users its object is shared with. Deleted tasks are not
+    resolved through the shares, their recipients were captured before the delete.
+    """
+    recipients = {}
+    for change in changes:
+        recipients.setdefault((change.content_type, change.object_id), set()).update(
+            {change.owner_id, *getattr(change, 'recipients', ())})
+    task_ids = {int(change.object_id) for change in changes
+                if change.content_type == Change.TASK and change.action != Change.DELETED}
+    for user_id, task_id in TaskVisibility.objects.shared_pairs(task_ids):
+        recipients[(Change.TASK, str(task_id))].add(user_id)
+    shares = Shared.objects.filter(
+        content_type__in=(Shared.PROJECT, Shared.TASK, Shared.TAG),
+        object_id__in={change.object_id for change in changes if change.content_type != Change.SHARED},
+    ).values_list('content_type', 'object_id', 'owner', 'shared_with')
+    # only the shares made by the owner of the changed object, as in ``TaskVisibilityManager.shared_pairs``
+    owners = {(change.content_type, change.object_id): change.owner_id for change in changes}
+    for content_type, object_id, owner_id, user_id in shares:
+        if owners.get((content_type, object_id)) == owner_id:
+            recipients[(content_type, object_id)].add(user_id)
+    return recipients
+
+
+def push_changes(channel_layer, changes):
+    recipients = change_recipients(changes)
+    group_send = async_to_sync(channel_layer.group_send)
+    for change in changes:
+        message = {
+            'type': 'change.recorded',
+            'change': {
+                'owner': change.owner_id,
+                'action': change.action,
+                'content_type': change.content_type,
+                'object_id': change.object_id,
+                'change_id': change.change_id,
+            },
+        }
+        for user_id in recipients[(change.content_type, change.object_id)]:
+            group_send(user_group(user_id), message)
+
+
+def push_reminders(channel_layer, tasks, now):
+    group_send = async_to_sync(channel_layer.group_send)
+    for task in tasks:
+        message = {
+            'type': 'reminder.due',
+            'reminder': {'type': 'reminder', 'task': task.pk, 'title': task.title, 'due_at': task.due_at().isoformat()},
+        }
+        group_send(user_group(task.owner_id), message)
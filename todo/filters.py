@@ -0,0 +1,16 @@
+import django_filters
+
+from .models import Task
+
+
+class TaskFilterSet(django_filters.FilterSet):
+    project = django_filters.NumberFilter(field_name='project')
+    parent = django_filters.NumberFilter(field_name='parent')
+    tag = django_filters.NumberFilter(field_name='tags')
+    deadline_date = django_filters.DateFromToRangeFilter()
+    priority = django_filters.RangeFilter()
+    updated_at = django_filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Task
+        fields = ('completed', 'project', 'parent', 'tag', 'deadline_date', 'priority', 'updated_at')
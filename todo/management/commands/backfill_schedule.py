@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from todo.models import Change, Task
+
+
+class Command(BaseCommand):
+    help = ('Recompute the precomputed scheduling columns of every task. Tasks whose due time changes are recorded '
+            'as updated, so clients pick it up on their next sync.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        queryset = Task.objects.filter(
+            Q(deadline_date__isnull=False) | Q(last_occurrence__isnull=False)
+            | Q(next_due_at__isnull=False) | Q(next_fire_at__isnull=False))
+        batch, updated = [], 0
+        for task in queryset.iterator(chunk_size=options['batch_size']):
+            batch.append(task)
+            if len(batch) == options['batch_size']:
+                updated += self.update(batch, now)
+                batch = []
+        updated += self.update(batch, now)
+        self.stdout.write(f'Updated {updated} tasks')
+
+    @staticmethod
+    def update(tasks, now):
+        """Write the tasks whose schedule changed and return how many there were."""
+        due_changed, fire_changed = [], []
+        for task in tasks:
+            due_at, fire_at = task.next_due_at, task.next_fire_at
+            task.refresh_schedule(now)
+            if task.next_due_at != due_at:
+                # next_due_at is part of the task clients see
+                task.updated_at = now
+                due_changed.append(task)
+            elif task.next_fire_at != fire_at:
+                fire_changed.append(task)
+        entries = defaultdict(list)
+        for task in due_changed:
+            entries[task.owner_id].append((Change.UPDATED, Change.TASK, task.pk))
+        with transaction.atomic():
+            Task.objects.bulk_update(due_changed, ['next_due_at', 'next_fire_at', 'updated_at'])
+            Task.objects.bulk_update(fire_changed, ['next_fire_at'])
+            for owner_id, owner_entries in entries.items():
+                Change.objects.record_many(owner_id, owner_entries, notify=False)
+        return len(due_changed) + len(fire_changed)
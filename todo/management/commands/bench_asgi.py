@@ -0,0 +1,55 @@
+import asyncio
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from todo.bench import seed_tasks
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Compare the sync and async task list endpoints through the ASGI handler at several concurrency levels. '
+            'Requests use distinct offsets so the response cache never answers them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--tasks', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username=f'bench-{uuid4().hex[:12]}')
+        try:
+            seed_tasks(user, options['tasks'])
+            token = str(AccessToken.for_user(user))
+            endpoints = {'sync': reverse('todo:tasks-list'), 'async': reverse('todo:async-tasks-list')}
+            for concurrency in options['concurrency']:
+                results = []
+                for label, url in endpoints.items():
+                    elapsed, errors = asyncio.run(self.load(url, token, concurrency, options['requests']))
+                    results.append(f'{label} {options["requests"] / elapsed:>7.0f} req/s ({errors} errors)')
+                self.stdout.write(f'{concurrency:>4} concurrent: ' + ', '.join(results))
+        finally:
+            user.delete()
+
+    @staticmethod
+    async def load(url, token, concurrency, total):
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {token}'}
+        offsets = iter(range(total))
+        errors = 0
+
+        async def work():
+            nonlocal errors
+            for offset in offsets:
+                response = await client.get(url, {'limit': 20, 'offset': offset}, headers=headers)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(work() for _ in range(concurrency)))
+        return time.perf_counter() - start, errors
@@ -0,0 +1,82 @@
+import random
+import threading
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from todo.bench import seed_tasks
+from todo.models import Task
+from todo.serializers import fast_task_serializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Measure mixed read/write throughput of the default database with concurrent workers. Writes go to a '
+            'temporary user that is deleted afterwards; run it once per database profile to compare them, e.g. '
+            'with SQLITE_TUNING=False.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of operations that create a task.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{connection.vendor} {self.describe()}')
+        user = User.objects.create_user(username=f'bench-{uuid4().hex[:12]}')
+        try:
+            seed_tasks(user, 500)
+            for threads in options['threads']:
+                counts = self.load(user, threads, options['seconds'], options['write_ratio'])
+                self.stdout.write(
+                    f'{threads:>3} threads: {(counts["reads"] + counts["writes"]) / options["seconds"]:>8.0f} ops/s '
+                    f'({counts["reads"]} reads, {counts["writes"]} writes, {counts["errors"]} errors)')
+        finally:
+            user.delete()
+
+    @staticmethod
+    def describe():
+        if connection.vendor != 'sqlite':
+            return connection.settings_dict.get('OPTIONS', {})
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+        return f'journal_mode={journal_mode} synchronous={synchronous}'
+
+    @staticmethod
+    def load(user, threads, seconds, write_ratio):
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+
+        def work():
+            local = dict.fromkeys(counts, 0)
+            queryset = Task.objects.filter(owner=user).order_by('-id')[:50]
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        if random.random() < write_ratio:
+                            Task.objects.create(owner=user, title='bench')
+                            local['writes'] += 1
+                        else:
+                            fast_task_serializer.serialize(list(fast_task_serializer.values(queryset)))
+                            local['reads'] += 1
+                    except DatabaseError:
+                        local['errors'] += 1
+            finally:
+                connection.close()
+            with lock:
+                for key, value in local.items():
+                    counts[key] += value
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return counts
@@ -0,0 +1,39 @@
+import uuid
+from statistics import median
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from todo.bench import seed_tasks, timed
+from todo.models import Task
+from todo.search import QuerySearchBackend, get_backend
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare search latency of the indexed backend and the icontains fallback by account size. Nothing is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', default='task 123')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        terms = options['query'].split()
+        self.stdout.write(f'{"tasks":>8} {"matches":>8} {type(backend).__name__ + " ms":>24} {"fallback ms":>12}')
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}')
+                seed_tasks(user, size)
+                # seeding bypasses the signals
+                queryset = Task.objects.filter(owner=user).only('id', 'owner_id', 'title', 'description')
+                for start in range(0, size, 2000):
+                    backend.index(list(queryset.order_by('id')[start:start + 2000]))
+                count = backend.search(user, terms, 0, 50)[0]
+                results = [median(timed(lambda: search.search(user, terms, 0, 50), options['repeat']))
+                           for search in (backend, QuerySearchBackend())]
+                self.stdout.write(f'{size:>8} {count:>8} {results[0]:>24.2f} {results[1]:>12.2f}')
+                transaction.set_rollback(True)
@@ -0,0 +1,45 @@
+import uuid
+from statistics import median
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from todo.bench import seed_tasks, timed
+from todo.models import Task
+from todo.renderers import FastJSONRenderer
+from todo.serializers import TaskSerializer, fast_task_serializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare serialize and render time of TaskSerializer and the fast read path. Nothing is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}')
+            seed_tasks(user, max(options['sizes']))
+            self.stdout.write(f'{"tasks":>6} {"drf ms":>10} {"fast ms":>10} {"fast+orjson ms":>15} {"speedup":>8}')
+            for size in options['sizes']:
+                queryset = Task.objects.filter(owner=user).order_by('id')[:size]
+
+                def drf():
+                    JSONRenderer().render(TaskSerializer(queryset.prefetch_related('tags'), many=True).data)
+
+                def fast():
+                    JSONRenderer().render(fast_task_serializer.serialize(list(fast_task_serializer.values(queryset))))
+
+                def fast_orjson():
+                    FastJSONRenderer().render(
+                        fast_task_serializer.serialize(list(fast_task_serializer.values(queryset))))
+
+                results = [median(timed(func, options['repeat'])) for func in (drf, fast, fast_orjson)]
+                self.stdout.write(f'{size:>6} {results[0]:>10.1f} {results[1]:>10.1f} {results[2]:>15.1f} '
+                                  f'{results[0] / results[2]:>7.1f}x')
+            transaction.set_rollback(True)
@@ -0,0 +1,45 @@
+import uuid
+from statistics import median
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from todo.bench import seed_tasks, timed
+from todo.models import Task, TaskCounter
+
+User = get_user_model()
+
+
+def aggregate_stats(user):
+    """The stats computed from the task rows, the baseline of the counters."""
+    tasks = Task.objects.filter(owner=user)
+    stats = tasks.aggregate(total=Count('id'), completed_count=Count('id', filter=Q(completed=True)),
+                            overdue=Count('id', filter=Q(completed=False, next_due_at__lt=timezone.now())))
+    stats['completed'] = stats.pop('completed_count')
+    stats['by_priority'] = dict(tasks.values_list('priority').annotate(Count('id')).order_by())
+    stats['by_tag'] = dict(tasks.filter(tags__isnull=False).values_list('tags').annotate(Count('id')).order_by())
+    return stats
+
+
+class Command(BaseCommand):
+    help = 'Compare the stats read from the task counters with aggregates over the tasks. Nothing is kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"tasks":>8} {"aggregate ms":>13} {"counters ms":>12}')
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}')
+                seed_tasks(user, size)
+                # seeding bypasses the signals
+                TaskCounter.objects.rebuild(user)
+                results = [median(timed(lambda: func(user), options['repeat']))
+                           for func in (aggregate_stats, TaskCounter.objects.stats)]
+                self.stdout.write(f'{size:>8} {results[0]:>13.2f} {results[1]:>12.2f}')
+                transaction.set_rollback(True)
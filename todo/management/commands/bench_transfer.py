@@ -0,0 +1,103 @@
+import asyncio
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from todo.bench import seed_tasks
+from todo.models import Project, Tag
+from todo.transfer import export_lines, import_lines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Measure time and peak Python memory (tracemalloc) of exporting and re-importing accounts of growing '
+            'size, and of the export endpoint served by the ASGI application. Timings include the tracing overhead. '
+            'The accounts are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write('DEBUG is on, the logged queries add to the measured memory. Run with DEBUG=False.')
+        self.stdout.write(f'{"tasks":>8} {"export s":>9} {"export MiB":>11} {"asgi s":>7} {"asgi MiB":>9} '
+                          f'{"import s":>9} {"import MiB":>11} {"file MiB":>9}')
+        for size in options['sizes']:
+            # committed, the ASGI export reads them from a connection of its own
+            source = User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}')
+            target = User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}')
+            try:
+                with tempfile.TemporaryFile() as export:
+                    seed_tasks(source, size)
+
+                    def export_account():
+                        for chunk in export_lines(source, options['chunk_size']):
+                            export.write(chunk)
+
+                    export_seconds, export_peak = self.measure(export_account)
+                    asgi_seconds, asgi_peak = self.measure(lambda: asyncio.run(self.asgi_export(source)))
+                    # titles are unique across users, free them for the import
+                    for model in (Project, Tag):
+                        model.objects.filter(owner=source).update(title=Concat('title', Value('-exported')))
+                    export.seek(0)
+                    import_seconds, import_peak = self.measure(
+                        lambda: import_lines(target, export, options['chunk_size']))
+                    self.stdout.write(
+                        f'{size:>8} {export_seconds:>9.1f} {export_peak:>11.1f} {asgi_seconds:>7.1f} '
+                        f'{asgi_peak:>9.1f} {import_seconds:>9.1f} {import_peak:>11.1f} '
+                        f'{export.tell() / 2 ** 20:>9.1f}')
+            finally:
+                source.delete()
+                target.delete()
+
+    @staticmethod
+    async def asgi_export(user):
+        """GET the export of ``user`` from the ASGI application, discarding the body as it is sent."""
+        from core.asgi import application
+
+        path = reverse('todo:account-export')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                # the client stays connected until the response is complete
+                await asyncio.Future()
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start' and message['status'] != 200:
+                raise RuntimeError(f'The export failed with status {message["status"]}.')
+
+        await application(scope, receive, send)
+
+    @staticmethod
+    def measure(func):
+        """Wall time in seconds and peak traced allocations in MiB of ``func``."""
+        reset_queries()
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func()
+            return time.perf_counter() - start, tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
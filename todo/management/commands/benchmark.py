@@ -0,0 +1,259 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean, median
+from uuid import uuid4
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from todo.bench import percentile, seed_dataset
+from todo.models import Change, Project, Tag, Task
+from users.serializers import TokenObtainPairSerializer
+
+User = get_user_model()
+
+PASSWORD = 'benchmark'
+# token obtain hashes a password per request, fewer of them keep a run short
+SLOW_ENDPOINTS = {'token-obtain': 5, 'async-token-obtain': 5}
+
+
+class Command(BaseCommand):
+    help = ('Seed users with projects, tasks, tags, shares and change history, then measure every endpoint: query '
+            'count, p50/p99 latency and throughput. Runs in-process, against --url or a local daphne started with '
+            '--daphne, and writes a JSON report that --compare diffs against an earlier one. The seeded users are '
+            'deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3)
+        parser.add_argument('--tasks', type=int, default=2000, help='Tasks per user.')
+        parser.add_argument('--projects', type=int, default=10, help='Projects per user.')
+        parser.add_argument('--tags', type=int, default=10, help='Tags per user.')
+        parser.add_argument('--shares', type=int, default=2, help='Projects and tags each user shares.')
+        parser.add_argument('--changes', type=int, default=5000, help='Change history per user.')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients against a server.')
+        parser.add_argument('--endpoints', nargs='+', help='Only run the endpoints whose name contains one of these.')
+        parser.add_argument('--url', help='Also run against this server, which must use the same database.')
+        parser.add_argument('--daphne', action='store_true', help='Also run against a local daphne.')
+        parser.add_argument('--no-in-process', action='store_true', help='Skip the in-process run.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--compare', help='Print the latency change against this earlier report.')
+
+    def handle(self, *args, **options):
+        dataset = {name: options[name] for name in ('users', 'tasks', 'projects', 'tags', 'shares', 'changes')}
+        prefix = f'bench-{uuid4().hex[:8]}'
+        start = time.perf_counter()
+        users = seed_dataset(prefix, password=PASSWORD, **dataset)
+        self.stdout.write(f'Seeded {dataset} in {time.perf_counter() - start:.1f}s')
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': dataset,
+            'requests': options['requests'],
+            'runs': [],
+        }
+        daphne = None
+        try:
+            targets = [] if options['no_in_process'] else [('in-process', None)]
+            if options['url']:
+                targets.append((options['url'], options['url'].rstrip('/')))
+            if options['daphne']:
+                daphne, url = self.start_daphne()
+                targets.append(('daphne', url))
+            for target, url in targets:
+                report['runs'].append(self.run(target, url, users[0], options))
+        finally:
+            if daphne is not None:
+                daphne.terminate()
+                daphne.wait()
+            # one at a time, the signals only skip the changes and counters of a user deleted as the origin
+            for user in User.objects.filter(username__startswith=f'{prefix}-'):
+                user.delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                self.compare(json.load(previous), report)
+
+    def endpoints(self, user):
+        """``(name, method, path, body, after)`` of every endpoint. Paths and bodies get the request index."""
+        project = Project.objects.filter(owner=user).order_by('id').values_list('id', flat=True).first()
+        tag = Tag.objects.filter(owner=user).order_by('id').values_list('id', flat=True).first()
+        tasks = Task.objects.filter(owner=user).values_list('id', flat=True)
+        task = tasks.order_by('-id').first()
+        root = tasks.filter(parent__isnull=True).order_by('id').first()
+        since = max(Change.objects.get_last_id(user) - 100, 0)
+        refresh = TokenObtainPairSerializer.get_token(user)
+        created = []
+
+        def remember(response_data):
+            created.append(json.loads(response_data)['id'])
+
+        return [
+            ('projects-list', 'GET', lambda i: '/api/projects/', None, None),
+            ('projects-detail', 'GET', lambda i: f'/api/projects/{project}/', None, None),
+            ('projects-stats', 'GET', lambda i: f'/api/projects/{project}/stats/', None, None),
+            ('tags-list', 'GET', lambda i: '/api/tags/', None, None),
+            ('tasks-list', 'GET', lambda i: f'/api/tasks/?limit=50&offset={i % 10 * 50}', None, None),
+            ('tasks-filter', 'GET', lambda i: f'/api/tasks/?priority={i % 5 + 1}&completed=false&limit=50', None, None),
+            ('tasks-detail', 'GET', lambda i: f'/api/tasks/{task}/', None, None),
+            ('tasks-tree', 'GET', lambda i: f'/api/tasks/{root}/tree/', None, None),
+            ('tasks-due', 'GET', lambda i: '/api/tasks/due/?within=P7D', None, None),
+            ('tasks-overdue', 'GET', lambda i: '/api/tasks/overdue/', None, None),
+            ('changes-list', 'GET', lambda i: '/api/changes/?limit=50', None, None),
+            ('changes-last-id', 'GET', lambda i: '/api/changes/last_id/', None, None),
+            ('changes-since', 'GET', lambda i: f'/api/changes/since/{since}/?limit=100', None, None),
+            ('changes-snapshot', 'GET', lambda i: '/api/changes/snapshot/', None, None),
+            ('shared-list', 'GET', lambda i: '/api/shared/', None, None),
+            ('shared-tasks', 'GET', lambda i: '/api/shared/tasks/?with-me=true&limit=50', None, None),
+            ('search', 'GET', lambda i: f'/api/search/?q=task+{i}', None, None),
+            ('stats', 'GET', lambda i: '/api/stats/', None, None),
+            ('account-export', 'GET', lambda i: '/api/account/export/', None, None),
+            ('async-projects-list', 'GET', lambda i: '/api/async/projects/', None, None),
+            ('async-tasks-list', 'GET', lambda i: f'/api/async/tasks/?limit=50&offset={i % 10 * 50}', None, None),
+            ('async-changes-last-id', 'GET', lambda i: '/api/async/changes/last_id/', None, None),
+            ('users-detail', 'GET', lambda i: f'/api/users/{user.pk}/', None, None),
+            ('token-obtain', 'POST', lambda i: '/api/token/',
+             lambda i: {'username': user.username, 'password': PASSWORD}, None),
+            ('async-token-obtain', 'POST', lambda i: '/api/async/token/',
+             lambda i: {'username': user.username, 'password': PASSWORD}, None),
+            ('token-refresh', 'POST', lambda i: '/api/token/refresh/', lambda i: {'refresh': str(refresh)}, None),
+            ('token-verify', 'POST', lambda i: '/api/token/verify/',
+             lambda i: {'token': str(refresh.access_token)}, None),
+            ('tasks-create', 'POST', lambda i: '/api/tasks/',
+             lambda i: {'title': f'bench {i}', 'project': project, 'tags': [tag]}, remember),
+            ('tasks-update', 'PATCH', lambda i: f'/api/tasks/{task}/', lambda i: {'priority': i % 5 + 1}, None),
+            ('tasks-bulk', 'POST', lambda i: '/api/tasks/bulk/',
+             lambda i: [{'op': 'create', 'data': {'title': f'bulk {i}.{j}'}} for j in range(10)], None),
+            ('tasks-delete', 'DELETE', lambda i: f'/api/tasks/{created.pop()}/', None, None),
+        ]
+
+    def run(self, target, url, user, options):
+        headers = {'Authorization': f'Bearer {TokenObtainPairSerializer.get_token(user).access_token}'}
+        send = self.client_sender(headers) if url is None else self.server_sender(url, headers)
+        concurrency = 1 if url is None else options['concurrency']
+        self.stdout.write(f'\n{target} ({concurrency} concurrent)')
+        self.stdout.write(f'{"endpoint":<24} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9} {"req/s":>8} {"errors":>7}')
+        results = []
+        for name, method, path, body, after in self.endpoints(user):
+            if options['endpoints'] and not any(part in name for part in options['endpoints']):
+                continue
+            if name == 'tasks-delete' and not any(result['name'] == 'tasks-create' for result in results):
+                continue
+            total = min(options['requests'], SLOW_ENDPOINTS.get(name, options['requests']))
+            result = self.measure(send, method, path, body, after, total, concurrency, count_queries=url is None)
+            result.update(name=name, method=method)
+            results.append(result)
+            queries = '-' if result['queries'] is None else f'{result["queries"]:g}'
+            self.stdout.write(f'{name:<24} {queries:>8} {result["p50_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                              f'{result["throughput_rps"]:>8.1f} {result["errors"]:>7}')
+        return {'target': target, 'concurrency': concurrency, 'endpoints': results}
+
+    @staticmethod
+    def measure(send, method, path, body, after, total, concurrency, count_queries):
+        timings, queries, errors, paths = [], [], [], {}
+
+        def request(i):
+            paths[i] = path(i)
+            data = None if body is None else json.dumps(body(i))
+            started = time.perf_counter()
+            if count_queries:
+                with CaptureQueriesContext(connection) as captured:
+                    status, content = send(method, paths[i], data)
+                queries.append(len(captured))
+            else:
+                status, content = send(method, paths[i], data)
+            timings.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(status)
+            elif after is not None:
+                after(content)
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            for i in range(total):
+                request(i)
+        else:
+            with ThreadPoolExecutor(concurrency) as executor:
+                list(executor.map(request, range(total)))
+        elapsed = time.perf_counter() - started
+        return {
+            'path': paths[0],
+            'requests': total,
+            'errors': len(errors),
+            'error_statuses': sorted(set(errors)),
+            'queries': median(queries) if queries else None,
+            'p50_ms': percentile(timings, 50),
+            'p99_ms': percentile(timings, 99),
+            'mean_ms': mean(timings),
+            'throughput_rps': total / elapsed,
+        }
+
+    @staticmethod
+    def client_sender(headers):
+        client = Client(headers=headers)
+
+        def send(method, path, data):
+            response = client.generic(method, path, data or '', content_type='application/json')
+            return response.status_code, response.getvalue()
+        return send
+
+    @staticmethod
+    def server_sender(url, headers):
+        sessions = threading.local()
+
+        def send(method, path, data):
+            if not hasattr(sessions, 'session'):
+                sessions.session = requests.Session()
+                sessions.session.headers.update({**headers, 'Content-Type': 'application/json'})
+            response = sessions.session.request(method, url + path, data=data)
+            return response.status_code, response.content
+        return send
+
+    def start_daphne(self, timeout=15):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port), 'core.asgi:application'],
+            env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'daphne exited with {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return process, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'daphne did not listen on port {port} within {timeout}s')
+
+    def compare(self, previous, report):
+        self.stdout.write(f'\nChange against the report of {previous["created_at"]}')
+        self.stdout.write(f'{"target":<12} {"endpoint":<24} {"p50":>8} {"p99":>8} {"queries":>8}')
+        before = {(run['target'], endpoint['name']): endpoint
+                  for run in previous['runs'] for endpoint in run['endpoints']}
+        for run in report['runs']:
+            for endpoint in run['endpoints']:
+                old = before.get((run['target'], endpoint['name']))
+                if old is None:
+                    continue
+                p50, p99 = (f'{(endpoint[key] / old[key] - 1) * 100:+.0f}%' if old[key] else '-'
+                            for key in ('p50_ms', 'p99_ms'))
+                queries = '-' if endpoint['queries'] is None or old['queries'] is None else \
+                    f'{endpoint["queries"] - old["queries"]:+g}'
+                self.stdout.write(f'{run["target"]:<12} {endpoint["name"]:<24} {p50:>8} {p99:>8} {queries:>8}')
@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from todo.models import Change
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Collapse superseded changes to the latest one per object and drop expired tombstones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGE_TOMBSTONE_RETENTION_DAYS,
+                            help='Keep deletions that are younger than this many days.')
+        parser.add_argument('--user', help='Only compact the changes of this username.')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and compact every this many seconds.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+        while True:
+            horizon = timezone.now() - timedelta(days=options['days'])
+            superseded, expired = Change.objects.compact(horizon, user=user)
+            self.stdout.write(f'Removed {superseded} superseded changes and {expired} expired tombstones')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
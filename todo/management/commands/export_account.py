@@ -0,0 +1,30 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.transfer import export_lines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Write the projects, tags, tasks and change history of a user as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', help='File to write to, standard output by default.')
+        parser.add_argument('--chunk-size', type=int, help='Rows read per database round trip.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist')
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in export_lines(user, options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,33 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from todo.transfer import import_lines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Create the records of an account export under a user, in one transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--input', help='File to read from, standard input by default.')
+        parser.add_argument('--batch-size', type=int, help='Rows written per bulk insert.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist')
+        source = open(options['input'], 'rb') if options['input'] else sys.stdin.buffer
+        try:
+            counts = import_lines(user, source, options['batch_size'])
+        except (ValueError, IntegrityError) as e:
+            raise CommandError(f'Import failed, nothing was written: {e}')
+        finally:
+            if options['input']:
+                source.close()
+        self.stdout.write(', '.join(f'{count} {kind}s' for kind, count in counts.items()) + ' imported')
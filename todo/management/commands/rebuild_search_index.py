@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from todo.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Re-create the search index from the tasks and projects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.rebuild(options['chunk_size'])
+        self.stdout.write(f'Rebuilt the index of {type(backend).__name__}')
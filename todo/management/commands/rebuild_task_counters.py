@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from todo.models import TaskCounter
+
+
+class Command(BaseCommand):
+    help = 'Re-create the task counters behind the stats endpoints from the tasks.'
+
+    def handle(self, *args, **options):
+        TaskCounter.objects.rebuild()
+        self.stdout.write(f'Rebuilt {TaskCounter.objects.count()} task counters')
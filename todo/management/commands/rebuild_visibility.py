@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from todo.models import TaskVisibility
+
+
+class Command(BaseCommand):
+    help = 'Re-create the shared task visibility index from the Shared rows.'
+
+    def handle(self, *args, **options):
+        TaskVisibility.objects.rebuild()
+        self.stdout.write(f'Indexed {TaskVisibility.objects.count()} shared tasks')
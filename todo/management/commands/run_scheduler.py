@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = 'Fire task reminders and roll recurring tasks forward.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon', type=int, default=60,
+                            help='Seconds of upcoming fire times to load per index scan.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--once', action='store_true', help='Fire what is due now and exit.')
+        parser.add_argument('--allow-in-memory-layer', action='store_true',
+                            help='Run on the in-memory channel layer, whose pushes never leave this process.')
+
+    def handle(self, *args, **options):
+        if isinstance(get_channel_layer(), InMemoryChannelLayer) and not options['allow_in_memory_layer']:
+            raise CommandError('The channel layer is in-memory, so reminders and changes would not reach the '
+                               'WebSocket clients of the web process. Set REDIS_URL, or pass --allow-in-memory-layer.')
+        scheduler = Scheduler(horizon=timedelta(seconds=options['horizon']), batch_size=options['batch_size'])
+        if options['once']:
+            self.stdout.write(f'Fired {scheduler.tick()} tasks')
+            return
+        scheduler.run()
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_counters(apps, schema_editor):
+    Change = apps.get_model('todo', 'Change')
+    ChangeCounter = apps.get_model('todo', 'ChangeCounter')
+    ChangeCounter.objects.bulk_create(
+        ChangeCounter(owner_id=row['owner'], last_id=row['last_id'])
+        for row in Change.objects.values('owner').annotate(last_id=models.Max('change_id')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo', '0002_shared'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_id', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='change',
+            name='content_type',
+            field=models.CharField(choices=[('P', 'Project'), ('T', 'Task'), ('G', 'Tag'), ('S', 'Shared')], max_length=1),
+        ),
+        migrations.AlterField(
+            model_name='shared',
+            name='content_type',
+            field=models.CharField(choices=[('P', 'Project'), ('G', 'Tag'), ('T', 'Task')], max_length=1),
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo', '0003_changecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='changecounter',
+            name='compacted_through',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['owner', 'content_type', 'object_id'], name='todo_change_owner_i_da667a_idx'),
+        ),
+    ]
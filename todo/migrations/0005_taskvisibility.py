@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_visibility(apps, schema_editor):
+    Shared = apps.get_model('todo', 'Shared')
+    Task = apps.get_model('todo', 'Task')
+    TaskVisibility = apps.get_model('todo', 'TaskVisibility')
+    # only shares made by the owner of the shared object make tasks visible
+    lookups = {'P': ('project_id', 'project__owner_id'), 'T': ('id', 'owner_id'), 'G': ('tags', 'tags__owner_id')}
+    visible = set()
+    for share in Shared.objects.filter(content_type__in=lookups).iterator():
+        if share.object_id.isdigit():
+            lookup, owner_lookup = lookups[share.content_type]
+            task_ids = Task.objects.filter(
+                **{lookup: share.object_id, owner_lookup: share.owner_id}).values_list('id', flat=True)
+            visible.update((share.shared_with_id, task_id) for task_id in task_ids)
+    TaskVisibility.objects.bulk_create(
+        [TaskVisibility(user_id=user_id, task_id=task_id) for user_id, task_id in visible], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo', '0004_change_compaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='todo.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visible_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'task')},
+            },
+        ),
+        migrations.RunPython(populate_visibility, migrations.RunPython.noop),
+    ]
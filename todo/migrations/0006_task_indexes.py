@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0005_taskvisibility'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'completed', 'deadline_date'], name='todo_task_owner_i_9da6f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'project'], name='todo_task_owner_i_a98a4b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'priority'], name='todo_task_owner_i_cf5632_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'updated_at'], name='todo_task_owner_i_55532a_idx'),
+        ),
+    ]
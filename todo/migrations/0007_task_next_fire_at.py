@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:09
+
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def due_at(task):
+    # Task.due_at, historical models have no methods
+    if (task.occurrence_minutes or 0) > 0 and task.last_occurrence:
+        return task.last_occurrence + timedelta(minutes=task.occurrence_minutes)
+    if task.deadline_date is None:
+        return None
+    return timezone.make_aware(datetime.combine(task.deadline_date, task.deadline_time or time.min))
+
+
+def populate_next_fire_at(apps, schema_editor):
+    # Task.next_fire_time of the tasks with a recurrence or a reminder
+    Task = apps.get_model('todo', 'Task')
+    now = timezone.now()
+    batch = []
+    tasks = Task.objects.filter(Q(occurrence_minutes__gt=0) | Q(reminder_minutes__isnull=False, completed=False))
+    for task in tasks.iterator(chunk_size=1000):
+        due = due_at(task)
+        if due is None:
+            continue
+        candidates = [due] if (task.occurrence_minutes or 0) > 0 else []
+        if task.reminder_minutes is not None and not task.completed:
+            reminder = due - timedelta(minutes=task.reminder_minutes)
+            if reminder > now:
+                candidates.append(reminder)
+        task.next_fire_at = min(candidates, default=None)
+        batch.append(task)
+        if len(batch) == 1000:
+            Task.objects.bulk_update(batch, ['next_fire_at'])
+            batch = []
+    Task.objects.bulk_update(batch, ['next_fire_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0006_task_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_next_fire_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def populate_next_due_at(apps, schema_editor):
+    # Task.due_at, historical models have no methods
+    Task = apps.get_model('todo', 'Task')
+    batch = []
+    tasks = Task.objects.filter(
+        Q(deadline_date__isnull=False) | Q(occurrence_minutes__gt=0, last_occurrence__isnull=False))
+    for task in tasks.iterator(chunk_size=1000):
+        if (task.occurrence_minutes or 0) > 0 and task.last_occurrence:
+            task.next_due_at = task.last_occurrence + timedelta(minutes=task.occurrence_minutes)
+        else:
+            task.next_due_at = timezone.make_aware(datetime.combine(task.deadline_date, task.deadline_time or time.min))
+        batch.append(task)
+        if len(batch) == 1000:
+            Task.objects.bulk_update(batch, ['next_due_at'])
+            batch = []
+    Task.objects.bulk_update(batch, ['next_due_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo', '0007_task_next_fire_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='next_due_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_next_due_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'completed', 'next_due_at'], name='todo_task_owner_i_333642_idx'),
+        ),
+    ]
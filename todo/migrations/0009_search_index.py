@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    task = quote(apps.get_model('todo', 'Task')._meta.db_table)
+    project = quote(apps.get_model('todo', 'Project')._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute("CREATE VIRTUAL TABLE todo_search USING fts5("
+                                   "owner, title, description, tokenize = 'porter unicode61')")
+            except OperationalError:
+                # built without FTS5, searches fall back to icontains
+                return
+            for table, kind in ((task, 0), (project, 1)):
+                cursor.execute(f"INSERT INTO todo_search (rowid, owner, title, description) "
+                               f"SELECT id * 2 + {kind}, 'u' || owner_id, title, coalesce(description, '') "
+                               f"FROM {table}")
+        elif connection.vendor == 'postgresql':
+            cursor.execute('CREATE TABLE todo_search (id bigint PRIMARY KEY, owner_id bigint NOT NULL, '
+                           'document tsvector NOT NULL)')
+            cursor.execute('CREATE INDEX todo_search_document ON todo_search USING gin (document)')
+            cursor.execute('CREATE INDEX todo_search_owner_id ON todo_search (owner_id)')
+            for table, kind in ((task, 0), (project, 1)):
+                cursor.execute(f"INSERT INTO todo_search (id, owner_id, document) "
+                               f"SELECT id * 2 + {kind}, owner_id, "
+                               f"setweight(to_tsvector(%s::regconfig, title), 'A') || "
+                               f"setweight(to_tsvector(%s::regconfig, coalesce(description, '')), 'B') "
+                               f"FROM {table}", [settings.TODO_SEARCH_CONFIG] * 2)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS todo_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0008_task_next_due_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
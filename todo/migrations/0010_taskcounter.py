@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Task = apps.get_model('todo', 'Task')
+    TaskCounter = apps.get_model('todo', 'TaskCounter')
+    fields = ('owner_id', 'project_id', 'priority', 'completed')
+    counters = [
+        TaskCounter(owner_id=owner_id, project=project_id or 0, priority=priority, completed=completed, count=count)
+        for owner_id, project_id, priority, completed, count in Task.objects.values_list(*fields).annotate(
+            count=Count('id')).order_by()
+    ]
+    counters += [
+        TaskCounter(owner_id=owner_id, project=project_id or 0, tag=tag_id, priority=priority, completed=completed,
+                    count=count)
+        for owner_id, project_id, priority, completed, tag_id, count in Task.objects.filter(
+            tags__isnull=False).values_list(*fields, 'tags').annotate(count=Count('id')).order_by()
+    ]
+    TaskCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todo', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.BigIntegerField(default=0)),
+                ('tag', models.BigIntegerField(default=0)),
+                ('priority', models.IntegerField()),
+                ('completed', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('owner', 'project', 'tag', 'priority', 'completed')},
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0010_taskcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='occurrence_minutes',
+            field=models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -1,7 +1,12 @@
 import datetime
+from collections import Counter
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, transaction, IntegrityError
+from django.db.models import Case, Count, Exists, F, Max, OuterRef, Q, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.dispatch import Signal
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -9,6 +14,11 @@ from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
+# sent with the ``changes`` written by ChangeManager.record and record_many
+changes_recorded = Signal()
+# sent by the scheduler with the ``tasks`` whose reminder fired at ``now``
+reminder_due = Signal()
+
 
 def current_date_time_validator(value):
     if value and value < timezone.now():
@@ -26,7 +36,24 @@ def current_date_validator(value: datetime.date):
         )
 
 
-class Project(models.Model):
+class LoadedValuesMixin:
+    """Remembers the column values an instance was loaded or last saved with."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+
+    def loaded_value(self, attname):
+        return getattr(self, '_loaded_values', {}).get(attname)
+
+
+class Project(LoadedValuesMixin, models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -48,7 +75,40 @@ class Tag(models.Model):
         return self.title
 
 
-class Task(models.Model):
+class TaskManager(models.Manager):
+    def shared_by(self, shares):
+        """
+        Tasks reachable through the projects, tasks or tags of a ``Shared`` queryset. Shares of objects their owner
+        does not own are ignored.
+        """
+        def shared_ids(content_type, model):
+            # object_id is free text, only cast the numeric ones, CASE keeps the database from casting the others
+            return shares.filter(content_type=content_type, object_id__regex=r'^[0-9]+$').annotate(shared_id=Case(
+                When(object_id__regex=r'^[0-9]+$', then=Cast('object_id', models.BigIntegerField())),
+            )).filter(
+                Exists(model.objects.filter(pk=OuterRef('shared_id'), owner=OuterRef('owner')))
+            ).values('shared_id')
+
+        return self.filter(
+            Q(project_id__in=shared_ids(Shared.PROJECT, Project)) |
+            Q(id__in=shared_ids(Shared.TASK, Task)) |
+            Q(id__in=self.filter(tags__in=shared_ids(Shared.TAG, Tag)).values('id'))
+        )
+
+    def subtree(self, root_ids):
+        """The tasks ``root_ids`` and all of their descendants, resolved by one recursive CTE."""
+        root_ids = list(root_ids)
+        if not root_ids:
+            return self.none()
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        sql = (f'WITH RECURSIVE subtree(id) AS ('
+               f'SELECT id FROM {table} WHERE id IN ({", ".join(["%s"] * len(root_ids))}) '
+               f'UNION SELECT task.id FROM {table} task INNER JOIN subtree ON task.parent_id = subtree.id'
+               f') SELECT id FROM subtree')
+        return self.filter(id__in=RawSQL(sql, root_ids))
+
+
+class Task(LoadedValuesMixin, models.Model):
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=100)
@@ -56,26 +116,174 @@ class Task(models.Model):
     deadline_date = models.DateField(blank=True, null=True, validators=[current_date_validator])
     deadline_time = models.TimeField(blank=True, null=True)
     completed = models.BooleanField(default=False)
-    occurrence_minutes = models.IntegerField(blank=True, null=True)
+    occurrence_minutes = models.IntegerField(blank=True, null=True, validators=[MinValueValidator(1)])
     last_occurrence = models.DateTimeField(blank=True, null=True)
     priority = models.IntegerField(default=1,
                                    validators=[MinValueValidator(1), MaxValueValidator(5)])
     tags = models.ManyToManyField(Tag, blank=True)
     reminder_minutes = models.IntegerField(blank=True, null=True)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, blank=True, null=True)
+    # precomputed due_at() and the next reminder or recurrence the scheduler has to act on, kept current by save()
+    next_due_at = models.DateTimeField(blank=True, null=True, editable=False)
+    next_fire_at = models.DateTimeField(blank=True, null=True, editable=False, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('owner', 'completed', 'deadline_date')),
+            models.Index(fields=('owner', 'project')),
+            models.Index(fields=('owner', 'priority')),
+            models.Index(fields=('owner', 'updated_at')),
+            models.Index(fields=('owner', 'completed', 'next_due_at')),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.refresh_schedule(timezone.now())
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'next_due_at', 'next_fire_at'}
+        super().save(*args, **kwargs)
+
+    def refresh_schedule(self, now):
+        self.next_due_at = self.due_at()
+        self.next_fire_at = self.next_fire_time(now)
+
+    def clean_value(self, name):
+        value = self._meta.get_field(name).to_python(getattr(self, name))
+        if isinstance(value, datetime.datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    @property
+    def occurrence(self):
+        return datetime.timedelta(minutes=self.occurrence_minutes) if (self.occurrence_minutes or 0) > 0 else None
+
+    def due_at(self):
+        """One period after the last occurrence for recurring tasks, otherwise the deadline."""
+        last_occurrence = self.clean_value('last_occurrence')
+        if self.occurrence and last_occurrence:
+            return last_occurrence + self.occurrence
+        deadline_date = self.clean_value('deadline_date')
+        if deadline_date is None:
+            return None
+        deadline_time = self.clean_value('deadline_time') or datetime.time.min
+        return timezone.make_aware(datetime.datetime.combine(deadline_date, deadline_time))
+
+    def reminder_at(self, due=None):
+        due = due or self.due_at()
+        if due is None or self.reminder_minutes is None or self.completed:
+            return None
+        return due - datetime.timedelta(minutes=self.reminder_minutes)
+
+    def roll_forward(self, now):
+        """Move a recurring task to its latest occurrence not after ``now`` and reopen it."""
+        due = self.due_at()
+        if not self.occurrence or due is None or due > now:
+            return False
+        self.last_occurrence = due + (now - due) // self.occurrence * self.occurrence
+        self.completed = False
+        return True
+
+    def next_fire_time(self, after):
+        """The earliest pending event: the next recurrence, or a reminder later than ``after``."""
+        due = self.due_at()
+        candidates = [due] if due is not None and self.occurrence else []
+        reminder = self.reminder_at(due)
+        if reminder is not None and reminder > after:
+            candidates.append(reminder)
+        return min(candidates, default=None)
+
 
 class ChangeManager(models.Manager):
     def get_last_id(self, user):
-        if not self.filter(owner=user).exists():
-            return 0
-        return self.filter(owner=user).last().change_id
+        counters = ChangeCounter.objects.db_manager(self.db)
+        last_id = counters.filter(owner=user).values_list('last_id', flat=True).first()
+        if last_id is None:
+            return self.filter(owner=user).aggregate(last_id=Max('change_id'))['last_id'] or 0
+        return last_id
+
+    async def aget_last_id(self, user):
+        last_id = await ChangeCounter.objects.filter(owner=user).values_list('last_id', flat=True).afirst()
+        if last_id is None:
+            return (await self.filter(owner=user).aaggregate(last_id=Max('change_id')))['last_id'] or 0
+        return last_id
+
+    def reserve_ids(self, user, count=1):
+        """Atomically advance the user's change counter and return the first of ``count`` new ids."""
+        user_id = getattr(user, 'pk', user)
+        with transaction.atomic(using=self.db):
+            counters = ChangeCounter.objects.using(self.db).filter(owner_id=user_id)
+            if not counters.update(last_id=F('last_id') + count):
+                try:
+                    with transaction.atomic(using=self.db):
+                        ChangeCounter.objects.using(self.db).create(
+                            owner_id=user_id, last_id=self.get_last_id(user_id) + count)
+                except IntegrityError:
+                    counters.update(last_id=F('last_id') + count)
+            last_id = counters.values_list('last_id', flat=True).get()
+        return last_id - count + 1
+
+    def compact(self, tombstones_before, user=None):
+        """
+        Drop every change that is superseded by a newer change of the same object and every
+        tombstone older than ``tombstones_before``. Returns the number of both.
+        """
+        changes = self.all() if user is None else self.filter(owner=user)
+        newer = self.filter(owner=OuterRef('owner'), content_type=OuterRef('content_type'),
+                            object_id=OuterRef('object_id'), change_id__gt=OuterRef('change_id'))
+        superseded, _ = changes.filter(Exists(newer)).delete()
+        tombstones = changes.filter(action=Change.DELETED, created_at__lt=tombstones_before)
+        with transaction.atomic(using=self.db):
+            for row in tombstones.values('owner').annotate(through=Max('change_id')).order_by():
+                ChangeCounter.objects.using(self.db).filter(
+                    owner_id=row['owner'], compacted_through__lt=row['through']
+                ).update(compacted_through=row['through'])
+            expired, _ = tombstones.delete()
+        return superseded, expired
+
+    def record(self, user, action, content_type, object_id, recipients=()):
+        """``recipients`` are users to push the change to besides the current shares, see ``record_many``."""
+        with transaction.atomic(using=self.db):
+            change = self.create(
+                owner_id=getattr(user, 'pk', user),
+                action=action,
+                content_type=content_type,
+                object_id=str(object_id),
+                change_id=self.reserve_ids(user)
+            )
+        change.recipients = set(recipients)
+        changes_recorded.send(sender=Change, changes=[change])
+        return change
+
+    def record_many(self, user, entries, notify=True, recipients=None):
+        """
+        Write ``(action, content_type, object_id)`` entries under one contiguous range of change ids. ``notify=False``
+        skips ``changes_recorded``, for imports whose changes are too many to push and are picked up by delta syncs.
+        ``recipients`` maps ``(content_type, object_id)`` to users the change is pushed to besides the current
+        shares, such as the users a deleted task was visible to.
+        """
+        entries = list(entries)
+        if not entries:
+            return []
+        recipients = recipients or {}
+        with transaction.atomic(using=self.db):
+            first_id = self.reserve_ids(user, len(entries))
+            changes = self.bulk_create([
+                Change(owner_id=getattr(user, 'pk', user), action=action, content_type=content_type,
+                       object_id=str(object_id), change_id=first_id + i)
+                for i, (action, content_type, object_id) in enumerate(entries)
+            ])
+        for change in changes:
+            change.recipients = set(recipients.get((change.content_type, change.object_id), ()))
+        if notify:
+            changes_recorded.send(sender=Change, changes=changes)
+        return changes
 
 
 class Change(models.Model):
@@ -102,14 +310,114 @@ class Change(models.Model):
     change_id = models.IntegerField()
     content_type = models.CharField(max_length=1, choices=MODEL_CHOICES)
     object_id = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     objects = ChangeManager()
 
     class Meta:
         unique_together = ('owner', 'change_id')
+        indexes = [models.Index(fields=('owner', 'content_type', 'object_id'))]
+
+
+class ChangeCounter(models.Model):
+    owner = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    last_id = models.IntegerField(default=0)
+    # tombstones up to this change id have been compacted away
+    compacted_through = models.IntegerField(default=0)
+
+
+class TaskCounterManager(models.Manager):
+    @staticmethod
+    def key(owner_id, project_id, priority, completed, tag_id=0):
+        return owner_id, project_id or 0, tag_id, priority, completed
+
+    def task_key(self, task, tag_id=0):
+        return self.key(task.owner_id, task.project_id, task.priority, task.completed, tag_id)
+
+    def keys(self, task_ids):
+        """The counter keys the given tasks count in, one per task and one per tag of a task."""
+        keys = Counter()
+        tasks = {row[0]: row[1:] for row in Task.objects.filter(id__in=task_ids).values_list(
+            'id', 'owner_id', 'project_id', 'priority', 'completed')}
+        for values in tasks.values():
+            keys[self.key(*values)] += 1
+        for task_id, tag_id in Task.tags.through.objects.filter(task_id__in=tasks).values_list('task_id', 'tag_id'):
+            keys[self.key(*tasks[task_id], tag_id)] += 1
+        return keys
+
+    def add(self, deltas):
+        """Add the ``{key: delta}`` counts, creating the missing counters."""
+        for (owner_id, project, tag, priority, completed), delta in deltas.items():
+            if not delta:
+                continue
+            counters = self.filter(owner_id=owner_id, project=project, tag=tag, priority=priority, completed=completed)
+            if not counters.update(count=F('count') + delta):
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.create(owner_id=owner_id, project=project, tag=tag, priority=priority,
+                                    completed=completed, count=delta)
+                except IntegrityError:
+                    counters.update(count=F('count') + delta)
+
+    def rebuild(self, owner=None):
+        """Re-create the counters of ``owner``, or of everyone, from grouped counts of the tasks."""
+        tasks = Task.objects.all() if owner is None else Task.objects.filter(owner=owner)
+        keys = Counter()
+        for owner_id, project_id, priority, completed, count in tasks.values_list(
+                'owner_id', 'project_id', 'priority', 'completed').annotate(count=Count('id')).order_by():
+            keys[self.key(owner_id, project_id, priority, completed)] += count
+        for owner_id, project_id, priority, completed, tag_id, count in tasks.filter(tags__isnull=False).values_list(
+                'owner_id', 'project_id', 'priority', 'completed', 'tags').annotate(count=Count('id')).order_by():
+            keys[self.key(owner_id, project_id, priority, completed, tag_id)] += count
+        with transaction.atomic(using=self.db):
+            (self.all() if owner is None else self.filter(owner=owner)).delete()
+            self.bulk_create([
+                TaskCounter(owner_id=owner_id, project=project, tag=tag, priority=priority, completed=completed,
+                            count=count)
+                for (owner_id, project, tag, priority, completed), count in keys.items()
+            ], batch_size=1000)
+
+    def stats(self, owner, project=None):
+        """Task counts of ``owner``, or of one of their projects, read from the counters."""
+        counters = self.filter(owner=owner)
+        tasks = Task.objects.filter(owner=owner)
+        if project is not None:
+            counters = counters.filter(project=getattr(project, 'pk', project))
+            tasks = tasks.filter(project=project)
+        stats = {'total': 0, 'completed': 0, 'overdue': 0, 'by_priority': dict.fromkeys(range(1, 6), 0), 'by_tag': {}}
+        rows = counters.values_list('tag', 'priority', 'completed').annotate(total=Sum('count')).order_by()
+        for tag, priority, completed, total in rows:
+            if tag:
+                stats['by_tag'][tag] = stats['by_tag'].get(tag, 0) + total
+                continue
+            stats['total'] += total
+            stats['completed'] += total if completed else 0
+            stats['by_priority'][priority] = stats['by_priority'].get(priority, 0) + total
+        stats['by_tag'] = {tag: total for tag, total in sorted(stats['by_tag'].items()) if total}
+        # time dependent, counted on the (owner, completed, next_due_at) index instead
+        stats['overdue'] = tasks.filter(completed=Value(False), next_due_at__lt=timezone.now()).count()
+        return stats
+
+
+class TaskCounter(models.Model):
+    """
+    Number of tasks per owner, project, priority and completion, kept current by the signals. Rows with ``tag`` 0
+    count tasks, the others count the tasks with that tag. ``project`` is 0 for tasks without a project.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    project = models.BigIntegerField(default=0)
+    tag = models.BigIntegerField(default=0)
+    priority = models.IntegerField()
+    completed = models.BooleanField()
+    count = models.IntegerField(default=0)
 
+    objects = TaskCounterManager()
 
-class Shared(models.Model):
+    class Meta:
+        unique_together = ('owner', 'project', 'tag', 'priority', 'completed')
+
+
+class Shared(LoadedValuesMixin, models.Model):
     PROJECT = 'P'
     TASK = 'T'
     TAG = 'G'
@@ -125,3 +433,69 @@ class Shared(models.Model):
     content_type = models.CharField(max_length=1, choices=SHARED_CHOICES)
     object_id = models.CharField(max_length=100)
 
+
+class TaskVisibilityManager(models.Manager):
+    def shared_pairs(self, task_ids):
+        """
+        Compute the ``(user_id, task_id)`` pairs the current shares make visible for the given tasks. Only the
+        shares made by the owner of the shared project, task or tag count.
+        """
+        tasks = Task.objects.filter(id__in=task_ids).values_list('id', 'owner_id', 'project_id', 'project__owner_id')
+        tags = Task.tags.through.objects.filter(task_id__in=task_ids).values_list('task_id', 'tag_id', 'tag__owner_id')
+        # (content type, object id) of each shareable target with its owner and the given tasks it covers
+        targets = {}
+        for task_id, owner_id, project_id, project_owner_id in tasks:
+            targets[(Shared.TASK, str(task_id))] = owner_id, {task_id}
+            if project_id is not None:
+                targets.setdefault((Shared.PROJECT, str(project_id)), (project_owner_id, set()))[1].add(task_id)
+        for task_id, tag_id, tag_owner_id in tags:
+            targets.setdefault((Shared.TAG, str(tag_id)), (tag_owner_id, set()))[1].add(task_id)
+
+        query = Q()
+        for content_type in (Shared.PROJECT, Shared.TASK, Shared.TAG):
+            object_ids = [object_id for target_type, object_id in targets if target_type == content_type]
+            if object_ids:
+                query |= Q(content_type=content_type, object_id__in=object_ids)
+        pairs = set()
+        if targets:
+            shares = Shared.objects.filter(query).values_list('content_type', 'object_id', 'owner', 'shared_with')
+            for content_type, object_id, owner_id, user_id in shares:
+                target_owner_id, target_task_ids = targets[(content_type, object_id)]
+                if owner_id == target_owner_id:
+                    pairs.update((user_id, task_id) for task_id in target_task_ids)
+        return pairs
+
+    def refresh_tasks(self, task_ids):
+        """Re-create the visibility rows of the given tasks from the current shares."""
+        task_ids = set(task_ids)
+        if not task_ids:
+            return
+        pairs = self.shared_pairs(task_ids)
+        with transaction.atomic(using=self.db):
+            self.filter(task_id__in=task_ids).delete()
+            self.bulk_create([TaskVisibility(user_id=user_id, task_id=task_id) for user_id, task_id in pairs])
+
+    def refresh_user(self, user):
+        """Re-create the visibility rows of everything shared with ``user``."""
+        user_id = getattr(user, 'pk', user)
+        task_ids = Task.objects.shared_by(Shared.objects.filter(shared_with_id=user_id)).values_list('id', flat=True)
+        with transaction.atomic(using=self.db):
+            self.filter(user_id=user_id).delete()
+            self.bulk_create([TaskVisibility(user_id=user_id, task_id=task_id) for task_id in task_ids],
+                             batch_size=1000)
+
+    def rebuild(self):
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            for user_id in Shared.objects.values_list('shared_with', flat=True).distinct().order_by():
+                self.refresh_user(user_id)
+
+
+class TaskVisibility(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='visible_tasks')
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='visibility')
+
+    objects = TaskVisibilityManager()
+
+    class Meta:
+        unique_together = ('user', 'task')
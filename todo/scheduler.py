@@ -0,0 +1,85 @@
+import heapq
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Change, Task, TaskCounter, reminder_due
+from .signals import batch_changes, count_tasks, record_change
+
+
+class Scheduler:
+    """
+    Fires reminders and rolls recurring tasks forward from ``Task.next_fire_at``.
+
+    Every ``horizon`` the rows firing before the end of the next window are read with one range scan of the
+    ``next_fire_at`` index into a heap; ticks in between only pop the heap. Tasks saved with a fire time inside an
+    already loaded window are picked up by the next load, so ``horizon`` bounds how late such an event can fire.
+    """
+
+    def __init__(self, clock=timezone.now, horizon=timedelta(minutes=1), batch_size=1000):
+        self.clock = clock
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.heap = []
+        self.loaded_until = None
+
+    def load(self, now):
+        self.loaded_until = now + self.horizon
+        rows = Task.objects.filter(next_fire_at__lte=self.loaded_until).values_list('next_fire_at', 'id')
+        self.heap = list(rows)
+        heapq.heapify(self.heap)
+
+    def next_wakeup(self):
+        if self.heap and self.heap[0][0] < self.loaded_until:
+            return self.heap[0][0]
+        return self.loaded_until
+
+    def tick(self):
+        """Fire everything due by the clock, returning the number of tasks handled."""
+        now = self.clock()
+        if self.loaded_until is None or now >= self.loaded_until:
+            self.load(now)
+        task_ids = set()
+        while self.heap and self.heap[0][0] <= now:
+            task_ids.add(heapq.heappop(self.heap)[1])
+        task_ids = sorted(task_ids)
+        return sum(self.fire(task_ids[i:i + self.batch_size], now) for i in range(0, len(task_ids), self.batch_size))
+
+    def fire(self, task_ids, now):
+        # rows changed since they were loaded are skipped, their new fire time is picked up by the next load
+        tasks = list(Task.objects.filter(id__in=task_ids, next_fire_at__lte=now))
+        reminders, rolled = [], []
+        for task in tasks:
+            fired_at = task.next_fire_at
+            if task.roll_forward(now):
+                task.updated_at = now
+                rolled.append(task)
+            reminder = task.reminder_at()
+            if reminder is not None and fired_at <= reminder <= now:
+                reminders.append(task)
+            task.refresh_schedule(now)
+            if task.next_fire_at is not None and task.next_fire_at < self.loaded_until:
+                heapq.heappush(self.heap, (task.next_fire_at, task.pk))
+
+        with transaction.atomic(), batch_changes():
+            # rolling forward reopens completed tasks
+            counted = TaskCounter.objects.keys([task.pk for task in rolled])
+            Task.objects.bulk_update(
+                rolled, ['last_occurrence', 'completed', 'next_due_at', 'next_fire_at', 'updated_at'])
+            deltas = TaskCounter.objects.keys([task.pk for task in rolled])
+            deltas.subtract(counted)
+            count_tasks(deltas)
+            rolled_ids = {task.pk for task in rolled}
+            Task.objects.bulk_update([task for task in tasks if task.pk not in rolled_ids], ['next_fire_at'])
+            for task in rolled:
+                record_change(task.owner_id, Change.UPDATED, Change.TASK, task.pk)
+        if reminders:
+            reminder_due.send(sender=Task, tasks=reminders, now=now)
+        return len(tasks)
+
+    def run(self, sleep=time.sleep, stop=lambda: False):
+        while not stop():
+            self.tick()
+            sleep(max((self.next_wakeup() - self.clock()).total_seconds(), 0))
@@ -0,0 +1,191 @@
+import re
+from functools import cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import import_string
+
+from .models import Change, Project, Task
+
+SEARCH_TABLE = 'todo_search'
+SEARCH_MODELS = {Task: Change.TASK, Project: Change.PROJECT}
+# relative weight of a title match over a description match
+TITLE_WEIGHT = 10
+
+
+def search_terms(query):
+    """The words of ``query``, without the operators and punctuation of the index query syntaxes."""
+    return re.findall(r'\w+', query)
+
+
+def document_id(content_type, object_id):
+    # tasks and projects share one index, told apart by the lowest bit of the row id
+    return object_id * 2 + (content_type == Change.PROJECT)
+
+
+def parse_document_id(doc_id):
+    return Change.PROJECT if doc_id % 2 else Change.TASK, doc_id // 2
+
+
+class SearchBackend:
+    """
+    Answers ranked searches over task and project titles and descriptions. ``index`` and ``remove`` keep the
+    backend's index in sync with saved and deleted objects, ``search`` returns the total number of matches and the
+    ``(content_type, object_id)`` of the requested page, best match first.
+    """
+
+    def index(self, objs):
+        pass
+
+    def remove(self, objs):
+        pass
+
+    def rebuild(self, chunk_size=2000):
+        pass
+
+    def search(self, user, terms, offset, limit):
+        raise NotImplementedError
+
+    @staticmethod
+    def documents(objs):
+        return [(document_id(SEARCH_MODELS[type(obj)], obj.pk), obj.owner_id, obj.title, obj.description or '')
+                for obj in objs]
+
+    def reindex_all(self, chunk_size):
+        for model in SEARCH_MODELS:
+            objs = []
+            for obj in model.objects.only('id', 'owner_id', 'title', 'description').iterator(chunk_size=chunk_size):
+                objs.append(obj)
+                if len(objs) == chunk_size:
+                    self.index(objs)
+                    objs = []
+            if objs:
+                self.index(objs)
+
+
+class QuerySearchBackend(SearchBackend):
+    """Fallback without an index, matching every term with ``icontains``. Title matches rank first."""
+
+    def search(self, user, terms, offset, limit):
+        querysets = []
+        for model, content_type in SEARCH_MODELS.items():
+            queryset = model.objects.filter(owner=user)
+            title_match = Q()
+            for term in terms:
+                queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+                title_match &= Q(title__icontains=term)
+            querysets.append(queryset.annotate(
+                content_type=Value(content_type),
+                rank=Case(When(title_match, then=Value(TITLE_WEIGHT)), default=Value(1), output_field=IntegerField()),
+            ).values_list('content_type', 'id', 'rank'))
+        count = sum(queryset.count() for queryset in querysets)
+        rows = querysets[0].union(*querysets[1:], all=True).order_by('-rank', 'content_type', 'id')
+        return count, [(content_type, pk) for content_type, pk, rank in rows[offset:offset + limit]]
+
+
+class IndexedSearchBackend(SearchBackend):
+    """Base of the backends with an index table, addressed by ``document_id`` and written through raw SQL."""
+
+    @staticmethod
+    def connection(write=True):
+        return connections[router.db_for_write(Task) if write else router.db_for_read(Task)]
+
+    def remove(self, objs):
+        connection = self.connection()
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {connection.ops.quote_name(SEARCH_TABLE)} WHERE {self.key} = %s',
+                               [(doc_id,) for doc_id, *document in self.documents(objs)])
+
+    def rebuild(self, chunk_size=2000):
+        connection = self.connection()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(SEARCH_TABLE)}')
+        self.reindex_all(chunk_size)
+
+    def search(self, user, terms, offset, limit):
+        connection = self.connection(write=False)
+        where, params = self.match(connection, user, terms)
+        table = connection.ops.quote_name(SEARCH_TABLE)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table} {where}', params)
+            count = cursor.fetchone()[0]
+            cursor.execute(f'SELECT {self.key} FROM {table} {where} ORDER BY {self.order_by} LIMIT %s OFFSET %s',
+                           [*params, *self.rank_params(terms), limit, offset])
+            return count, [parse_document_id(doc_id) for doc_id, in cursor.fetchall()]
+
+
+class SQLiteSearchBackend(IndexedSearchBackend):
+    """
+    SQLite FTS5 table with the porter stemmer, ranked by bm25. The owner is an indexed column as well, so a search
+    only walks the posting lists of the user's own documents. The last term matches as a prefix.
+    """
+    key = 'rowid'
+    order_by = f'bm25({SEARCH_TABLE}, 0, {TITLE_WEIGHT}, 1), rowid'
+
+    def index(self, objs):
+        documents = self.documents(objs)
+        connection = self.connection()
+        table = connection.ops.quote_name(SEARCH_TABLE)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(doc_id,) for doc_id, *document in documents])
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, owner, title, description) VALUES (%s, %s, %s, %s)',
+                [(doc_id, f'u{owner_id}', title, description) for doc_id, owner_id, title, description in documents])
+
+    @staticmethod
+    def match(connection, user, terms):
+        phrases = ' '.join(f'"{term}"' for term in terms) + '*'
+        return (f'WHERE {connection.ops.quote_name(SEARCH_TABLE)} MATCH %s',
+                [f'owner : "u{user.pk}" AND {{title description}} : ({phrases})'])
+
+    @staticmethod
+    def rank_params(terms):
+        return []
+
+
+class PostgresSearchBackend(IndexedSearchBackend):
+    """
+    Postgres table of ``tsvector`` documents with a GIN index, titles weighted A and descriptions B, ranked by
+    ``ts_rank``. The text search configuration is ``TODO_SEARCH_CONFIG``. The last term matches as a prefix.
+    """
+    key = 'id'
+    order_by = 'ts_rank(document, to_tsquery(%s::regconfig, %s)) DESC, id'
+
+    def index(self, objs):
+        config = settings.TODO_SEARCH_CONFIG
+        connection = self.connection()
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {connection.ops.quote_name(SEARCH_TABLE)} (id, owner_id, document) '
+                f"VALUES (%s, %s, setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+                f'ON CONFLICT (id) DO UPDATE SET owner_id = EXCLUDED.owner_id, document = EXCLUDED.document',
+                [(doc_id, owner_id, config, title, config, description)
+                 for doc_id, owner_id, title, description in self.documents(objs)])
+
+    @staticmethod
+    def tsquery(terms):
+        return ' & '.join(terms) + ':*'
+
+    def match(self, connection, user, terms):
+        return ('WHERE owner_id = %s AND document @@ to_tsquery(%s::regconfig, %s)',
+                [user.pk, settings.TODO_SEARCH_CONFIG, self.tsquery(terms)])
+
+    def rank_params(self, terms):
+        return [settings.TODO_SEARCH_CONFIG, self.tsquery(terms)]
+
+
+@cache
+def get_backend():
+    """``TODO_SEARCH_BACKEND`` if set, otherwise the indexed backend of the database if its index was created."""
+    if settings.TODO_SEARCH_BACKEND:
+        return import_string(settings.TODO_SEARCH_BACKEND)()
+    connection = connections[DEFAULT_DB_ALIAS]
+    backend_class = {'sqlite': SQLiteSearchBackend, 'postgresql': PostgresSearchBackend}.get(connection.vendor)
+    if backend_class is None:
+        return QuerySearchBackend()
+    with connection.cursor() as cursor:
+        if SEARCH_TABLE not in connection.introspection.table_names(cursor):
+            return QuerySearchBackend()
+    return backend_class()
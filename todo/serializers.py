@@ -1,4 +1,11 @@
-from rest_framework import serializers
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
 from .models import Project, Tag, Task, Change, Shared
 
@@ -29,7 +36,7 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'parent', 'owner', 'title', 'description', 'deadline_date', 'deadline_time', 'completed',
             'occurrence_minutes', 'last_occurrence', 'priority', 'tags', 'reminder_minutes', 'project',
-            'created_at', 'updated_at')
+            'next_due_at', 'created_at', 'updated_at')
         extra_kwargs = {'read_only_fields': ('id', 'owner', 'created_at', 'updated_at')}
 
 
@@ -40,8 +47,10 @@ class ChangeSerializer(serializers.ModelSerializer):
         model = Change
         fields = ('action', 'change_id', 'content_type', 'object_id', 'content')
 
-    @staticmethod
-    def get_content(obj: Change):
+    def get_content(self, obj: Change):
+        contents = self.context.get('contents')
+        if contents is not None and obj.content_type in CONTENT_MODELS:
+            return contents.get((obj.content_type, obj.object_id), {})
         if obj.content_type == Change.PROJECT:
             try:
                 return ProjectSerializer(Project.objects.get(id=obj.object_id)).data
@@ -59,8 +68,139 @@ class ChangeSerializer(serializers.ModelSerializer):
                 return {}
 
 
+SHARED_MODELS = {
+    Shared.PROJECT: Project,
+    Shared.TASK: Task,
+    Shared.TAG: Tag,
+}
+
+CONTENT_MODELS = {
+    Change.PROJECT: (Project, ProjectSerializer),
+    Change.TASK: (Task, TaskSerializer),
+    Change.TAG: (Tag, TagSerializer),
+}
+
+
+def load_contents(changes):
+    """Serialize the objects referenced by ``changes`` with one query per content type."""
+    object_ids = {}
+    for change in changes:
+        if change.content_type in CONTENT_MODELS and change.object_id.isdigit():
+            object_ids.setdefault(change.content_type, set()).add(int(change.object_id))
+
+    contents = {}
+    for content_type, ids in object_ids.items():
+        model, serializer_class = CONTENT_MODELS[content_type]
+        queryset = model.objects.all()
+        if model is Task:
+            queryset = queryset.prefetch_related('tags')
+        for pk, instance in queryset.in_bulk(ids).items():
+            contents[(content_type, str(pk))] = serializer_class(instance).data
+    return contents
+
+
 class SharedSerializer(serializers.ModelSerializer):
     class Meta:
         model = Shared
         fields = ('id', 'owner', 'shared_with', 'content_type', 'object_id')
-        extra_kwargs = {'read_only_fields': ('id', 'owner')}
+        read_only_fields = ('id', 'owner')
+
+    def validate(self, attrs):
+        # only the owner of an object can share it, the shares of other objects would make them visible
+        owner = self.instance.owner if self.instance else self.context['request'].user
+        content_type = attrs.get('content_type', getattr(self.instance, 'content_type', None))
+        object_id = attrs.get('object_id', getattr(self.instance, 'object_id', ''))
+        model = SHARED_MODELS[content_type]
+        if not object_id.isdigit() or not model.objects.filter(pk=object_id, owner=owner).exists():
+            raise serializers.ValidationError(
+                {'object_id': f'Must be the id of one of your {model._meta.verbose_name_plural}.'})
+        return attrs
+
+
+class FastReadSerializer:
+    """
+    Read-only counterpart of a ModelSerializer that renders ``.values()`` rows into the same output, without
+    model instances or per-instance field objects. Many-to-many ids are loaded with one query per field.
+    """
+    passthrough_fields = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def layout(self):
+        model = self.serializer_class.Meta.model
+        m2m_fields = {field.name: field for field in model._meta.many_to_many}
+        fields, related = [], []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in m2m_fields:
+                related.append((name, m2m_fields[name]))
+                convert = None
+            elif type(field) in self.passthrough_fields or isinstance(field, serializers.PrimaryKeyRelatedField):
+                convert = None
+            elif self.is_iso_datetime(field):
+                convert = self.datetime_to_representation
+            else:
+                convert = field.to_representation
+            fields.append((name, convert))
+        columns = [name for name, convert in fields if name not in m2m_fields]
+        return fields, related, columns
+
+    @staticmethod
+    def is_iso_datetime(field):
+        return (type(field) is serializers.DateTimeField and not hasattr(field, 'timezone') and settings.USE_TZ
+                and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601)
+
+    @staticmethod
+    def datetime_to_representation(value, tz):
+        # DateTimeField.to_representation with the current timezone looked up once per batch
+        value = value.astimezone(tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def values(self, queryset):
+        return queryset.values(*self.layout[2])
+
+    def links(self, rows):
+        """The ``(source id, target id)`` through rows of each many-to-many field, by field name."""
+        for name, field in self.layout[1]:
+            through = field.remote_field.through
+            source, target = field.m2m_column_name(), field.m2m_reverse_name()
+            links = through.objects.filter(**{f'{source}__in': [row['id'] for row in rows]})
+            yield name, links.order_by('pk').values_list(source, target)
+
+    def serialize(self, rows):
+        for name, links in self.links(rows):
+            self.attach(rows, name, links)
+        return self.render(rows)
+
+    async def aserialize(self, rows):
+        for name, links in self.links(rows):
+            self.attach(rows, name, [link async for link in links])
+        return self.render(rows)
+
+    @staticmethod
+    def attach(rows, name, links):
+        ids = defaultdict(list)
+        for source_id, target_id in links:
+            ids[source_id].append(target_id)
+        for row in rows:
+            row[name] = ids.get(row['id'], [])
+
+    def render(self, rows):
+        tz = timezone.get_current_timezone()
+        fields = [(name, partial(convert, tz=tz) if convert == self.datetime_to_representation else convert)
+                  for name, convert in self.layout[0]]
+        return [
+            {name: row[name] if convert is None or row[name] is None else convert(row[name])
+             for name, convert in fields}
+            for row in rows
+        ]
+
+
+fast_project_serializer = FastReadSerializer(ProjectSerializer)
+fast_tag_serializer = FastReadSerializer(TagSerializer)
+fast_task_serializer = FastReadSerializer(TaskSerializer)
@@ -1,55 +1,264 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.utils import timezone
 
-from .models import Change, Project, Tag, Task, Shared
+from . import search
+from .consumers import push_changes, push_reminders
+from .models import (
+    Change, Project, Tag, Task, TaskCounter, Shared, TaskVisibility, changes_recorded, reminder_due,
+)
 
+User = get_user_model()
 
-@receiver(post_save)
-def project_post_save(sender, instance, created, **kwargs):
-    if sender == Project:
-        content_type = Change.PROJECT
-    elif sender == Tag:
-        content_type = Change.TAG
-    elif sender == Task:
-        content_type = Change.TASK
-    elif sender == Shared:
-        content_type = Change.SHARED
-    else:
+CONTENT_TYPES = {
+    Project: Change.PROJECT,
+    Tag: Change.TAG,
+    Task: Change.TASK,
+    Shared: Change.SHARED,
+}
+# the fields of a task that select its TaskCounter rows
+COUNTED_FIELDS = ('owner_id', 'project_id', 'priority', 'completed')
+
+_batch = threading.local()
+
+
+@contextmanager
+def batch_changes():
+    """
+    Collect the changes and task counts recorded inside the block, merge the ones of the same object or counter and
+    write them in one batch on exit. Run it inside the transaction of the writes, so they commit with them.
+    """
+    if getattr(_batch, 'changes', None) is not None:
+        yield
         return
-    if created:
-        Change.objects.create(
-            owner=instance.owner,
-            action=Change.CREATED,
-            content_type=content_type,
-            object_id=str(instance.pk),
-            change_id=Change.objects.get_last_id(instance.owner) + 1
-        )
-    else:
-        Change.objects.create(
-            owner=instance.owner,
-            action=Change.UPDATED,
-            content_type=content_type,
-            object_id=str(instance.pk),
-            change_id=Change.objects.get_last_id(instance.owner) + 1
-        )
-
-
-@receiver(post_delete)
-def project_post_delete(sender, instance, **kwargs):
-    if sender == Project:
-        content_type = Change.PROJECT
-    elif sender == Tag:
-        content_type = Change.TAG
-    elif sender == Task:
-        content_type = Change.TASK
-    elif sender == Shared:
-        content_type = Change.SHARED
+    _batch.changes = changes = {}
+    _batch.recipients = recipients = {}
+    _batch.counts = counts = Counter()
+    try:
+        yield
+    finally:
+        _batch.changes = _batch.recipients = _batch.counts = None
+    for user_id, entries in changes.items():
+        Change.objects.record_many(user_id, [(action, *key) for key, action in entries.items()],
+                                   recipients=recipients.get(user_id))
+    TaskCounter.objects.add(counts)
+
+
+def merge_action(previous, action):
+    """The single action equivalent to ``previous`` followed by ``action`` on one object, None if they cancel out."""
+    if previous == Change.CREATED:
+        return None if action == Change.DELETED else Change.CREATED
+    if previous == Change.DELETED and action == Change.CREATED:
+        return Change.UPDATED
+    return action
+
+
+def record_change(user_id, action, content_type, object_id, recipients=()):
+    changes = getattr(_batch, 'changes', None)
+    if changes is None:
+        Change.objects.record(user_id, action, content_type, object_id, recipients)
+        return
+    entries = changes.setdefault(user_id, {})
+    key = (content_type, str(object_id))
+    if key in entries:
+        # merged entries move to the end, after the changes of objects they may now refer to
+        action = merge_action(entries.pop(key), action)
+    if action is not None:
+        entries[key] = action
+    if recipients:
+        _batch.recipients.setdefault(user_id, {}).setdefault(key, set()).update(recipients)
+
+
+def count_tasks(deltas):
+    """Add ``{counter key: delta}`` to the TaskCounter rows, at the end of the enclosing batch if there is one."""
+    counts = getattr(_batch, 'counts', None)
+    if counts is None:
+        TaskCounter.objects.add(deltas)
     else:
+        counts.update(deltas)
+
+
+def change_post_save(sender, instance, created, **kwargs):
+    action = Change.CREATED if created else Change.UPDATED
+    record_change(instance.owner_id, action, CONTENT_TYPES[sender], instance.pk)
+
+
+def change_post_delete(sender, instance, origin=None, **kwargs):
+    # the changes of a deleted user go with it
+    if not (isinstance(origin, User) and origin.pk == instance.owner_id):
+        record_change(instance.owner_id, Change.DELETED, CONTENT_TYPES[sender], instance.pk,
+                      getattr(instance, '_visible_to', ()))
+
+
+for model in CONTENT_TYPES:
+    post_save.connect(change_post_save, sender=model, dispatch_uid=f'change_post_save_{model.__name__}')
+    post_delete.connect(change_post_delete, sender=model, dispatch_uid=f'change_post_delete_{model.__name__}')
+
+
+def search_post_save(sender, instance, created, **kwargs):
+    if created or any(instance.loaded_value(attname) != getattr(instance, attname)
+                      for attname in ('owner_id', 'title', 'description')):
+        search.get_backend().index([instance])
+
+
+def search_post_delete(sender, instance, **kwargs):
+    search.get_backend().remove([instance])
+
+
+for model in search.SEARCH_MODELS:
+    post_save.connect(search_post_save, sender=model, dispatch_uid=f'search_post_save_{model.__name__}')
+    post_delete.connect(search_post_delete, sender=model, dispatch_uid=f'search_post_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=Task)
+def task_visibility_post_save(sender, instance, **kwargs):
+    if instance.project_id != instance.loaded_value('project_id'):
+        TaskVisibility.objects.refresh_tasks([instance.pk])
+
+
+def touch_tasks(task_ids):
+    """Move ``updated_at`` of tasks whose tags changed, which does not save them, and return the new value."""
+    now = timezone.now()
+    Task.objects.filter(id__in=task_ids).update(updated_at=now)
+    return now
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+def task_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_task_ids = list(instance.task_set.values_list('id', flat=True))
+    elif action == 'pre_clear':
+        instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        sign = 1 if action == 'post_add' else -1
+        if not reverse:
+            instance.updated_at = touch_tasks([instance.pk])
+            TaskVisibility.objects.refresh_tasks([instance.pk])
+            record_change(instance.owner_id, Change.UPDATED, Change.TASK, instance.pk)
+            tag_ids = getattr(instance, '_cleared_tag_ids', []) if action == 'post_clear' else pk_set
+            count_tasks({TaskCounter.objects.task_key(instance, tag_id): sign for tag_id in tag_ids})
+            return
+        task_ids = getattr(instance, '_cleared_task_ids', []) if action == 'post_clear' else pk_set
+        touch_tasks(task_ids)
+        TaskVisibility.objects.refresh_tasks(task_ids)
+        deltas = Counter()
+        for task_id, *values in Task.objects.filter(id__in=task_ids).values_list('id', *COUNTED_FIELDS):
+            record_change(values[0], Change.UPDATED, Change.TASK, task_id)
+            deltas[TaskCounter.objects.key(*values, instance.pk)] += sign
+        count_tasks(deltas)
+
+
+@receiver(pre_save, sender=Task)
+def counter_pre_save(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if instance.pk is not None and not all(attname in loaded for attname in COUNTED_FIELDS):
+        # saved without being loaded, read the values it is counted with
+        values = Task.objects.filter(pk=instance.pk).values(*COUNTED_FIELDS).first()
+        instance._loaded_values = {**loaded, **(values or {})}
+
+
+@receiver(post_save, sender=Task)
+def counter_post_save(sender, instance, created, **kwargs):
+    if created:
+        count_tasks({TaskCounter.objects.task_key(instance): 1})
+        return
+    previous = [instance.loaded_value(attname) for attname in COUNTED_FIELDS]
+    if previous == [getattr(instance, attname) for attname in COUNTED_FIELDS]:
         return
-    Change.objects.create(
-        owner=instance.owner,
-        action=Change.DELETED,
-        content_type=content_type,
-        object_id=str(instance.pk),
-        change_id=Change.objects.get_last_id(instance.owner) + 1
-    )
+    deltas = Counter()
+    for tag_id in [0, *Task.tags.through.objects.filter(task_id=instance.pk).values_list('tag_id', flat=True)]:
+        deltas[TaskCounter.objects.key(*previous, tag_id)] -= 1
+        deltas[TaskCounter.objects.task_key(instance, tag_id)] += 1
+    count_tasks(deltas)
+
+
+@receiver(pre_delete, sender=Task)
+def visibility_pre_delete(sender, instance, origin=None, **kwargs):
+    # the visibility rows are gone by post_delete, the delete is pushed to the users they list
+    if not (isinstance(origin, User) and origin.pk == instance.owner_id):
+        instance._visible_to = list(TaskVisibility.objects.filter(task=instance).values_list('user_id', flat=True))
+
+
+@receiver(pre_delete, sender=Task)
+def counter_pre_delete(sender, instance, origin=None, **kwargs):
+    # the tags are gone by post_delete
+    if not (isinstance(origin, User) and origin.pk == instance.owner_id):
+        instance._counted_tag_ids = list(
+            Task.tags.through.objects.filter(task_id=instance.pk).values_list('tag_id', flat=True))
+
+
+@receiver(post_delete, sender=Task)
+def counter_post_delete(sender, instance, origin=None, **kwargs):
+    # the counters of a deleted user go with it
+    if not (isinstance(origin, User) and origin.pk == instance.owner_id):
+        tag_ids = [0, *getattr(instance, '_counted_tag_ids', [])]
+        count_tasks({TaskCounter.objects.task_key(instance, tag_id): -1 for tag_id in tag_ids})
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_pre_delete(sender, instance, origin=None, **kwargs):
+    # its task links are deleted without m2m_changed, and are gone by post_delete; the tasks of a deleted user go too
+    tasks = instance.task_set.all()
+    if isinstance(origin, User):
+        tasks = tasks.exclude(owner_id=origin.pk)
+    instance._tagged_task_ids = list(tasks.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_tasks_post_delete(sender, instance, **kwargs):
+    task_ids = getattr(instance, '_tagged_task_ids', [])
+    touch_tasks(task_ids)
+    for task_id, owner_id in Task.objects.filter(id__in=task_ids).values_list('id', 'owner_id'):
+        record_change(owner_id, Change.UPDATED, Change.TASK, task_id)
+
+
+@receiver(post_delete, sender=Tag)
+def counter_tag_post_delete(sender, instance, **kwargs):
+    # its task links are deleted without m2m_changed, the counters are keyed by the owners of the tagged tasks
+    TaskCounter.objects.filter(tag=instance.pk).delete()
+    counts = getattr(_batch, 'counts', None) or {}
+    for key in [key for key in counts if key[2] == instance.pk]:
+        del counts[key]
+
+
+@receiver(post_delete, sender=Tag)
+def tag_visibility_post_delete(sender, instance, **kwargs):
+    shares = Shared.objects.filter(content_type=Shared.TAG, object_id=str(instance.pk))
+    for user_id in shares.values_list('shared_with', flat=True).distinct():
+        TaskVisibility.objects.refresh_user(user_id)
+
+
+@receiver(post_save, sender=Shared)
+def shared_visibility_post_save(sender, instance, **kwargs):
+    TaskVisibility.objects.refresh_user(instance.shared_with_id)
+    previous = instance.loaded_value('shared_with_id')
+    if previous is not None and previous != instance.shared_with_id:
+        TaskVisibility.objects.refresh_user(previous)
+
+
+@receiver(post_delete, sender=Shared)
+def shared_visibility_post_delete(sender, instance, origin=None, **kwargs):
+    if not (isinstance(origin, User) and origin.pk == instance.shared_with_id):
+        TaskVisibility.objects.refresh_user(instance.shared_with_id)
+
+
+@receiver(changes_recorded)
+def changes_recorded_push(sender, changes, **kwargs):
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        transaction.on_commit(partial(push_changes, channel_layer, changes))
+
+
+@receiver(reminder_due)
+def reminder_due_push(sender, tasks, now, **kwargs):
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        push_reminders(channel_layer, tasks, now)
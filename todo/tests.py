@@ -1,9 +1,31 @@
+import json
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from channels.testing import HttpCommunicator, WebsocketCommunicator
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
 from django.urls import reverse
-from django.test import TestCase
+from django.utils import timezone
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import RequestsClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.asgi import application
+from core.db import ReplicaRouter, replica_middleware
 
-from .models import Project, Tag, Task, Change
+from . import cache as response_cache, search as todo_search, serializers as todo_ss, transfer
+from .models import Project, Tag, Task, TaskCounter, Change, ChangeCounter, Shared, TaskVisibility, reminder_due
+from .renderers import FastJSONRenderer
+from .scheduler import Scheduler
+from .signals import batch_changes
 
 User = get_user_model()
 
@@ -68,6 +90,16 @@ class ProjectTestCase(TestCase):
                          json={'title': 'test2', 'description': 'test2'}, headers=self.header1)
         self.assertEqual(response.status_code, 405, msg=f'Project must not be updated {response.json()}')
 
+    def test_bulk_unique_titles(self):
+        response = c.post(self.api_url + 'bulk/', json=[
+            {'op': 'create', 'data': {'title': 'p1'}},
+            {'op': 'create', 'data': {'title': 'p1'}},
+        ], headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg=f'Repeated titles must be rejected {response.json()}')
+        self.assertEqual([(row['status'], list(row.get('errors', {}))) for row in response.json()['results']],
+                         [(424, []), (400, ['title'])], msg='The repeated title must be reported on its operation')
+        self.assertFalse(Project.objects.exists(), msg='Nothing must be applied')
+
     def test_deadline_before_current_date(self):
         response = c.post(self.api_url, {'title': 'test', 'deadline': '2020-01-01'}, headers=self.header1)
         self.assertEqual(response.status_code, 400, msg=f'Task must not be created {response.json()}')
@@ -190,6 +222,408 @@ class TaskTestCase(TestCase):
         response = c.post(self.api_url, {'title': 'test', 'priority': -1}, headers=self.header1)
         self.assertEqual(response.status_code, 400, msg=f'Task must not be created {response.json()}')
 
+    def test_filter_tasks(self):
+        user = User.objects.get(username='test')
+        project = Project.objects.create(owner=user, title='p1')
+        tag = Tag.objects.create(owner=user, title='g1')
+        Task.objects.create(owner=user, title='buy milk', priority=1, completed=True, project=project)
+        Task.objects.create(owner=user, title='buy bread', priority=3, deadline_date='2100-01-02').tags.add(tag)
+        Task.objects.create(owner=user, title='call mom', priority=5, deadline_date='2100-01-05', project=project)
+
+        def titles(query):
+            response = c.get(self.api_url + query, headers=self.header1)
+            self.assertEqual(response.status_code, 200, msg=f'Tasks must be filtered {response.json()}')
+            return [task['title'] for task in response.json()['results']]
+
+        self.assertEqual(titles('?completed=false&ordering=-priority'), ['call mom', 'buy bread'],
+                         msg='Tasks must be filtered by completion')
+        self.assertEqual(titles(f'?project={project.id}&ordering=title'), ['buy milk', 'call mom'],
+                         msg='Tasks must be filtered by project')
+        self.assertEqual(titles(f'?tag={tag.id}'), ['buy bread'], msg='Tasks must be filtered by tag')
+        self.assertEqual(titles('?priority_min=2&priority_max=4'), ['buy bread'],
+                         msg='Tasks must be filtered by priority')
+        self.assertEqual(titles('?deadline_date_after=2100-01-03'), ['call mom'],
+                         msg='Tasks must be filtered by deadline')
+        self.assertEqual(titles('?search=buy&ordering=priority'), ['buy milk', 'buy bread'],
+                         msg='Tasks must be searched by title')
+        self.assertEqual(c.get(self.api_url + '?completed=false', headers=self.header2).json()['count'], 0,
+                         msg='Other users tasks must not be received')
+
+    def test_bulk_tasks(self):
+        user = User.objects.get(username='test')
+        tag = Tag.objects.create(owner=user, title='g1')
+        updated = Task.objects.create(owner=user, title='t1')
+        deleted = Task.objects.create(owner=user, title='t2')
+        other = Task.objects.create(owner=User.objects.get(username='test2'), title='t3')
+        last_id = Change.objects.get_last_id(user)
+        url = S_URL + reverse('todo:tasks-bulk')
+
+        response = c.post(url, json=[
+            {'op': 'create', 'data': {'title': 'n1'}},
+            {'op': 'update', 'id': other.id, 'data': {'title': 'x'}},
+            {'op': 'create', 'data': {'priority': 9}},
+        ], headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg=f'Invalid operations must be rejected {response.json()}')
+        self.assertEqual([row['status'] for row in response.json()['results']], [424, 404, 400],
+                         msg='Each operation must report its result')
+        self.assertFalse(Task.objects.filter(title='n1').exists(), msg='Nothing must be applied')
+
+        response = c.post(url, json=[
+            {'op': 'create', 'data': {'title': 'n1', 'tags': [tag.id]}},
+            {'op': 'create', 'data': {'title': 'n2'}},
+            {'op': 'update', 'id': updated.id, 'data': {'completed': True, 'tags': [tag.id]}},
+            {'op': 'delete', 'id': deleted.id},
+        ], headers=self.header1)
+        self.assertEqual(response.status_code, 200, msg=f'Operations must be applied {response.json()}')
+        results = response.json()['results']
+        self.assertEqual([row['status'] for row in results], [201, 201, 200, 204], msg=f'Results must match {results}')
+        created = Task.objects.get(id=results[0]['id'])
+        self.assertEqual(list(created.tags.all()), [tag], msg='Created task tags must be set')
+        updated.refresh_from_db()
+        self.assertTrue(updated.completed, msg='Task must be updated')
+        self.assertEqual(list(updated.tags.all()), [tag], msg='Updated task tags must be set')
+        self.assertFalse(Task.objects.filter(id=deleted.id).exists(), msg='Task must be deleted')
+        changes = list(Change.objects.filter(owner=user, change_id__gt=last_id).order_by('change_id').values_list(
+            'change_id', 'action'))
+        self.assertEqual(changes, [(last_id + 1, Change.CREATED), (last_id + 2, Change.CREATED),
+                                   (last_id + 3, Change.UPDATED), (last_id + 4, Change.DELETED)],
+                         msg=f'Changes must be recorded in one contiguous range {changes}')
+
+    def test_conditional_get(self):
+        user = User.objects.get(username='test')
+        task = Task.objects.create(owner=user, title='t1')
+        response = c.get(self.api_url, headers=self.header1)
+        etag = response.headers['ETag']
+        response = c.get(self.api_url, headers={**self.header1, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304, msg='Unchanged list must not be sent again')
+        response = c.get(self.api_url + '?completed=true', headers={**self.header1, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200, msg='Different query must not match')
+        Task.objects.create(owner=user, title='t2')
+        response = c.get(self.api_url, headers={**self.header1, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200, msg=f'Changed list must be sent {response.status_code}')
+
+        url = S_URL + reverse('todo:tasks-detail', kwargs={'pk': task.id})
+        response = c.get(url, headers=self.header1)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        response = c.get(url, headers={**self.header1, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304, msg='Unchanged task must not be sent again')
+        response = c.get(url, headers={**self.header1, 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304, msg='Unmodified task must not be sent again')
+        c.patch(url, json={'title': 't3'}, headers=self.header1)
+        response = c.get(url, headers={**self.header1, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200, msg=f'Changed task must be sent {response.status_code}')
+        response = c.get(url, headers={**self.header2, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 404, msg='Other users task must not be received')
+
+        tag = Tag.objects.create(owner=user, title='g1')
+        for change_tags in (lambda: task.tags.add(tag), lambda: tag.task_set.clear(), lambda: task.tags.add(tag),
+                            tag.delete):
+            etag = c.get(url, headers=self.header1).headers['ETag']
+            change_tags()
+            response = c.get(url, headers={**self.header1, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200, msg='Task with changed tags must be sent')
+
+    def test_cached_list(self):
+        user = User.objects.get(username='test')
+        task = Task.objects.create(owner=user, title='t1')
+        response_cache.get_cache().clear()
+        response_cache.reset_stats()
+        first = c.get(self.api_url, headers=self.header1).json()
+        second = c.get(self.api_url, headers=self.header1).json()
+        self.assertEqual(first, second, msg='Cached list must match')
+        self.assertEqual(response_cache.stats()['hits'], 1, msg=f'List must be cached {response_cache.stats()}')
+        task.tags.add(Tag.objects.create(owner=user, title='g1'))
+        data = c.get(self.api_url, headers=self.header1).json()
+        self.assertEqual(len(data['results'][0]['tags']), 1, msg='Writes must invalidate the cached list')
+        self.assertEqual(c.get(self.api_url, headers=self.header2).json()['count'], 0,
+                         msg='Cached list must not be shared between users')
+        self.assertEqual(response_cache.stats()['misses'], 3, msg=f'Misses must be counted {response_cache.stats()}')
+
+    def test_fast_serializer(self):
+        user = User.objects.get(username='test')
+        tags = [Tag.objects.create(owner=user, title=f'g{i}') for i in range(2)]
+        parent = Task.objects.create(owner=user, title='t1', deadline_date='2100-01-01', deadline_time='10:30',
+                                     last_occurrence=timezone.now(), occurrence_minutes=60)
+        child = Task.objects.create(owner=user, parent=parent, title='t2 \u2028', description='ünïcode',
+                                    project=Project.objects.create(owner=user, title='p1'))
+        child.tags.add(*tags)
+        queryset = Task.objects.filter(owner=user).order_by('id')
+        expected = JSONRenderer().render(todo_ss.TaskSerializer(queryset, many=True).data)
+        rows = todo_ss.fast_task_serializer.serialize(list(todo_ss.fast_task_serializer.values(queryset)))
+        self.assertEqual(JSONRenderer().render(rows), expected, msg='Fast serializer output must match')
+        self.assertEqual(FastJSONRenderer().render(rows), expected, msg='Fast renderer output must match')
+        response = c.get(S_URL + reverse('todo:tasks-detail', kwargs={'pk': child.id}), headers=self.header1)
+        self.assertEqual(response.json(), json.loads(expected)[1], msg='Task detail must match')
+        call_command('bench_serializers', sizes=[5], repeat=1, stdout=StringIO())
+
+    def test_benchmark(self):
+        users = User.objects.count()
+        with tempfile.NamedTemporaryFile('r') as output:
+            call_command('benchmark', users=2, tasks=20, changes=10, requests=2, endpoints=['stats', 'tasks-'],
+                         output=output.name, stdout=StringIO())
+            report = json.load(output)
+        endpoints = report['runs'][0]['endpoints']
+        self.assertIn('tasks-delete', [endpoint['name'] for endpoint in endpoints], msg='Endpoints must be measured')
+        self.assertEqual([endpoint['errors'] for endpoint in endpoints], [0] * len(endpoints),
+                         msg='Benchmarked requests must succeed')
+        self.assertEqual(User.objects.count(), users, msg='Seeded users must be deleted')
+
+    def test_merged_changes(self):
+        user = User.objects.get(username='test')
+        tag = Tag.objects.create(owner=user, title='g1')
+        last_id = Change.objects.get_last_id(user)
+
+        def new_changes():
+            changes = Change.objects.filter(owner=user, change_id__gt=last_id).order_by('change_id')
+            return list(changes.values_list('action', 'content_type', 'object_id'))
+
+        response = c.post(self.api_url, json={'title': 't1', 'tags': [tag.id]}, headers=self.header1)
+        task_id = str(response.json()['id'])
+        self.assertEqual(new_changes(), [(Change.CREATED, Change.TASK, task_id)], msg='Create with tags is one change')
+        last_id = Change.objects.get_last_id(user)
+        with transaction.atomic(), batch_changes():
+            Task.objects.create(owner=user, title='t2').delete()
+            task = Task.objects.get(id=task_id)
+            task.save()
+            task.tags.clear()
+        self.assertEqual(new_changes(), [(Change.UPDATED, Change.TASK, task_id)], msg='Changes must be merged')
+
+    def test_stats(self):
+        user = User.objects.get(username='test')
+        project = Project.objects.create(owner=user, title='p1')
+        tag1, tag2 = Tag.objects.create(owner=user, title='g1'), Tag.objects.create(owner=user, title='g2')
+
+        def counters():
+            return {tuple(key): count for *key, count in TaskCounter.objects.filter(owner=user).values_list(
+                'project', 'tag', 'priority', 'completed', 'count') if count}
+
+        def assert_counted(msg):
+            counted = counters()
+            TaskCounter.objects.rebuild(user)
+            self.assertEqual(counted, counters(), msg=msg)
+
+        response = c.post(self.api_url, json={'title': 't1', 'project': project.id, 'priority': 3,
+                                              'tags': [tag1.id, tag2.id]}, headers=self.header1)
+        task1 = Task.objects.get(id=response.json()['id'])
+        task2 = Task.objects.create(owner=user, title='t2', completed=True)
+        task2.tags.add(tag1)
+        Task.objects.create(owner=user, title='t3', deadline_date=timezone.now().date() - timedelta(days=1))
+        assert_counted('Creates must be counted')
+        c.patch(self.api_url + f'{task1.id}/', json={'completed': True, 'tags': [tag2.id]}, headers=self.header1)
+        tag2.task_set.add(task2)
+        task2.tags.clear()
+        assert_counted('Updates and tag changes must be counted')
+        c.post(self.api_url + 'bulk/', json=[
+            {'op': 'update', 'id': task1.id, 'data': {'priority': 5, 'completed': False}},
+            {'op': 'create', 'data': {'title': 't4', 'tags': [tag1.id]}},
+            {'op': 'delete', 'id': task2.id},
+        ], headers=self.header1)
+        assert_counted('Bulk writes must be counted')
+
+        response = c.get(S_URL + reverse('todo:stats'), headers=self.header1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'total': 3, 'completed': 0, 'overdue': 1, 'by_priority': {'1': 2, '2': 0, '3': 0, '4': 0, '5': 1},
+            'by_tag': {str(tag1.id): 1, str(tag2.id): 1},
+        })
+        response = c.get(S_URL + reverse('todo:projects-stats', kwargs={'pk': project.id}), headers=self.header1)
+        self.assertEqual(response.json(), {
+            'total': 1, 'completed': 0, 'overdue': 0, 'by_priority': {'1': 0, '2': 0, '3': 0, '4': 0, '5': 1},
+            'by_tag': {str(tag2.id): 1},
+        })
+        response = c.get(S_URL + reverse('todo:projects-stats', kwargs={'pk': project.id}), headers=self.header2)
+        self.assertEqual(response.status_code, 404, msg='Stats of other users projects must not be found')
+
+        tag2.delete()
+        project.delete()
+        assert_counted('Deletes must be counted')
+        self.assertEqual(TaskCounter.objects.stats(user)['total'], 2)
+
+    def test_delete_foreign_tag(self):
+        user, other = User.objects.get(username='test'), User.objects.get(username='test2')
+        for delete in (Tag.delete, lambda tag: tag.owner.delete()):
+            tag = Tag.objects.create(owner=user, title='g1')
+            task = Task.objects.create(owner=other, title='t1')
+            task.tags.add(tag)
+            self.assertEqual(TaskCounter.objects.stats(other)['by_tag'], {tag.id: 1})
+            last_id = Change.objects.get_last_id(other)
+            delete(tag)
+            self.assertEqual(TaskCounter.objects.stats(other)['by_tag'], {},
+                             msg='Deleted tags must leave the stats of other users')
+            changes = Change.objects.filter(owner=other, change_id__gt=last_id)
+            self.assertEqual(list(changes.values_list('action', 'object_id')), [(Change.UPDATED, str(task.id))],
+                             msg='Tasks of other users must be updated when their tag is deleted')
+            task.delete()
+
+    def test_search(self):
+        user = User.objects.get(username='test')
+        project = Project.objects.create(owner=user, title='Groceries', description='weekly milk run')
+        in_title = Task.objects.create(owner=user, title='Buy milk', description='two bottles')
+        in_description = Task.objects.create(owner=user, title='Errands', description='milk and bread')
+        Task.objects.create(owner=User.objects.get(username='test2'), title='milk')
+
+        def search(q, **params):
+            response = c.get(S_URL + reverse('todo:search') + '?' + urlencode({'q': q, **params}), headers=self.header1)
+            self.assertEqual(response.status_code, 200, msg='Search must succeed')
+            return response.json()
+
+        result = search('Milk')
+        self.assertEqual(result['count'], 3, msg='Only own objects must match')
+        self.assertEqual({(hit['content_type'], hit['object_id']) for hit in result['results']},
+                         {('T', in_title.id), ('T', in_description.id), ('P', project.id)})
+        self.assertEqual(result['results'][0]['content']['title'], 'Buy milk', msg='Title matches must rank first')
+        result = search('milk', limit=1, offset=1)
+        self.assertEqual((result['count'], len(result['results'])), (3, 1), msg='Results must be paginated')
+        self.assertIsNotNone(result['next'])
+        self.assertEqual(search('bottle bre')['count'], 0, msg='Every word must match')
+        self.assertEqual(search('milk bre')['count'], 1, msg='The last word must match as a prefix')
+        response = c.get(S_URL + reverse('todo:search') + '?q=%21', headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg='A query without words must be rejected')
+
+        in_description.description = 'bread'
+        in_description.save()
+        in_title.delete()
+        c.post(self.api_url + 'bulk/', json=[{'op': 'create', 'data': {'title': 'more milk'}}], headers=self.header1)
+        self.assertEqual([hit['content']['title'] for hit in search('milk')['results']], ['more milk', 'Groceries'],
+                         msg='The index must follow saves, deletes and bulk writes')
+        self.assertEqual(todo_search.get_backend().search(user, ['milk'], 0, 10),
+                         todo_search.QuerySearchBackend().search(user, ['milk'], 0, 10),
+                         msg='Fallback must match the same')
+
+    def test_account_export_import(self):
+        user = User.objects.get(username='test')
+        project = Project.objects.create(owner=user, title='p1')
+        tag = Tag.objects.create(owner=user, title='g1')
+        child = Task.objects.create(owner=user, title='child', project=project)
+        parent = Task.objects.create(owner=user, title='parent', completed=True)
+        child.parent = parent
+        child.save()
+        child.tags.add(tag)
+        created_at = Task.objects.get(id=child.id).created_at
+
+        response = c.get(S_URL + reverse('todo:account-export'), headers=self.header1)
+        self.assertEqual(response.status_code, 200, msg='Export must succeed')
+        self.assertEqual(response.headers['Content-Type'], 'application/x-ndjson')
+        lines = response.content.splitlines()
+        kinds = [json.loads(line)['type'] for line in lines]
+        self.assertEqual(kinds[:6], ['account', 'project', 'tag', 'task', 'task', 'task_tag'], msg='Records in order')
+        self.assertIn('change', kinds, msg='Change history must be exported')
+
+        import_url = S_URL + reverse('todo:account-import')
+        response = c.post(import_url, data=b'\n'.join(lines[:1] + [b'{"type": "task", "id": 1}']), headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg='Invalid records must fail the import')
+        response = c.post(import_url, data=response.content, headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg='A body without header must fail the import')
+        for name, value in (('priority', 99), ('title', 't' * 101), ('completed', None)):
+            task = {**json.loads(lines[kinds.index('task')]), 'project': None, 'parent': None, name: value}
+            response = c.post(import_url, data=b'\n'.join([lines[0], json.dumps(task).encode()]), headers=self.header1)
+            self.assertEqual(response.status_code, 400, msg=f'Invalid {name} must fail the import')
+            self.assertIn(f'task {name}', str(response.json()['detail']), msg='The invalid field must be reported')
+        self.assertEqual(Task.objects.filter(owner=user).count(), 2, msg='A failed import must not write anything')
+        response = c.post(import_url, data=b'\n'.join(lines), headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg='Taken titles must fail the import')
+        self.assertIn("project title 'p1' is already taken", str(response.json()['detail']),
+                      msg='The taken title must be reported')
+        Project.objects.filter(owner=user).delete()
+        Tag.objects.filter(owner=user).delete()
+        Task.objects.filter(owner=user).delete()
+        last_id = Change.objects.get_last_id(user)
+        response = c.post(import_url, data=b'\n'.join(lines), headers=self.header1)
+        self.assertEqual(response.status_code, 201, msg='Import must succeed')
+        self.assertEqual(response.json(), {'project': 1, 'tag': 1, 'task': 2, 'task_tag': 1})
+        child = Task.objects.get(owner=user, title='child')
+        self.assertEqual(child.parent.title, 'parent', msg='Parents must be remapped')
+        self.assertTrue(child.parent.completed)
+        self.assertEqual(child.project.title, 'p1', msg='Projects must be remapped')
+        self.assertEqual([tag.title for tag in child.tags.all()], ['g1'], msg='Tags must be remapped')
+        self.assertEqual(child.created_at, created_at, msg='Timestamps must be kept')
+        changes = Change.objects.filter(owner=user, change_id__gt=last_id)
+        self.assertEqual(sorted(changes.values_list('action', 'content_type')),
+                         [('C', 'G'), ('C', 'P'), ('C', 'T'), ('C', 'T')], msg='Imported objects must be recorded')
+
+    def test_async_views(self):
+        user = User.objects.get(username='test')
+        tag = Tag.objects.create(owner=user, title='g1')
+        for i in range(3):
+            Task.objects.create(owner=user, title=f't{i}', priority=i + 1).tags.add(tag)
+        for name, query in (('tasks-list', '?limit=2&offset=1'), ('tasks-list', '?priority_min=2'),
+                            ('tags-list', ''), ('changes-last-id', '')):
+            expected = c.get(S_URL + reverse(f'todo:{name}') + query, headers=self.header1)
+            response = c.get(S_URL + reverse(f'todo:async-{name}') + query, headers=self.header1)
+            self.assertEqual(json.loads(response.text.replace('/api/async/', '/api/')), expected.json(),
+                             msg=f'Async {name} must match')
+        task = Task.objects.filter(owner=user).first()
+        response = c.get(S_URL + reverse('todo:async-tasks-detail', kwargs={'pk': task.id}), headers=self.header1)
+        self.assertEqual(response.json()['title'], task.title, msg='Async task must be received')
+        response = c.get(S_URL + reverse('todo:async-tasks-detail', kwargs={'pk': task.id}), headers=self.header2)
+        self.assertEqual(response.status_code, 404, msg='Async task of another user must not be received')
+        response = c.get(S_URL + reverse('todo:async-tasks-list'))
+        self.assertEqual(response.status_code, 401, msg='Async list must require authentication')
+
+    def test_due_tasks(self):
+        user = User.objects.get(username='test')
+        now = timezone.now()
+        Task.objects.create(owner=user, title='overdue', last_occurrence=now - timedelta(hours=2),
+                            occurrence_minutes=60)
+        Task.objects.create(owner=user, title='soon', last_occurrence=now, occurrence_minutes=60)
+        Task.objects.create(owner=user, title='later', last_occurrence=now, occurrence_minutes=60 * 48)
+        Task.objects.create(owner=user, title='done', last_occurrence=now, occurrence_minutes=60, completed=True)
+        Task.objects.create(owner=user, title='undated')
+
+        def titles(url):
+            response = c.get(S_URL + reverse(url) + '?' + urlencode(params), headers=self.header1)
+            return [task['title'] for task in response.json()['results']]
+
+        params = {}
+        self.assertEqual(titles('todo:tasks-due'), ['soon'], msg='Only pending tasks due within a day must be listed')
+        self.assertEqual(titles('todo:tasks-overdue'), ['overdue'], msg='Only overdue tasks must be listed')
+        params = {'within': 'P3D'}
+        self.assertEqual(titles('todo:tasks-due'), ['soon', 'later'], msg='Due tasks must be ordered by due time')
+        params = {'within': 'soon'}
+        response = c.get(S_URL + reverse('todo:tasks-due') + '?' + urlencode(params), headers=self.header1)
+        self.assertEqual(response.status_code, 400, msg='Invalid duration must be rejected')
+
+        stale = Task.objects.get(title='overdue')
+        Task.objects.filter(id=stale.id).update(next_due_at=None)
+        last_id = Change.objects.get_last_id(user)
+        call_command('backfill_schedule', stdout=StringIO())
+        task = Task.objects.get(id=stale.id)
+        self.assertEqual(task.next_due_at, stale.next_due_at, msg='Backfill must restore the due time')
+        self.assertGreater(task.updated_at, stale.updated_at, msg='Backfilled tasks must be marked as updated')
+        changes = Change.objects.filter(owner=user, change_id__gt=last_id)
+        self.assertEqual(list(changes.values_list('action', 'object_id')), [(Change.UPDATED, str(task.id))],
+                         msg='Only the backfilled task must be recorded')
+
+    def test_task_tree(self):
+        user = User.objects.get(username='test')
+        root = Task.objects.create(owner=user, title='root')
+        child = Task.objects.create(owner=user, parent=root, title='child')
+        Task.objects.create(owner=user, parent=child, title='grandchild')
+        Task.objects.create(owner=user, parent=root, title='child2')
+        Task.objects.create(owner=user, title='other')
+
+        def titles(node):
+            return [node['title'], [titles(child) for child in node['children']]]
+
+        # user flags, recursive subtree query and tag ids
+        with self.assertNumQueries(3):
+            tree = c.get(S_URL + reverse('todo:tasks-tree', kwargs={'pk': root.id}), headers=self.header1)
+        self.assertEqual(titles(tree.json()), ['root', [['child', [['grandchild', []]]], ['child2', []]]],
+                         msg='Tree must contain every descendant')
+        response = c.get(S_URL + reverse('todo:tasks-tree', kwargs={'pk': child.id}), headers=self.header2)
+        self.assertEqual(response.status_code, 404, msg='Other users must not see the tree')
+        response = c.get(S_URL + reverse('todo:tasks-list') + '?tree=1', headers=self.header1)
+        self.assertEqual([titles(node) for node in response.json()['results']],
+                         [titles(tree.json()), ['other', []]], msg='List tree must nest every task')
+        response = c.get(S_URL + reverse('todo:tasks-list') + '?tree=1&limit=1&offset=1', headers=self.header1)
+        self.assertEqual(response.json()['count'], 2, msg='List tree must count the roots')
+        self.assertEqual([titles(node) for node in response.json()['results']], [['other', []]],
+                         msg='List tree must paginate the roots')
+        response = c.get(S_URL + reverse('todo:tasks-list') + '?tree=1&search=child', headers=self.header1)
+        self.assertEqual([titles(node) for node in response.json()['results']],
+                         [['child', [['grandchild', []]]], ['child2', []]],
+                         msg='Listed tasks under an unlisted parent must be roots')
+
 
 # noinspection DuplicatedCode
 class ChangeTestCase(TestCase):
@@ -223,3 +657,440 @@ class ChangeTestCase(TestCase):
         self.assertEqual(response.status_code, 404, msg=f'Change must not be received {response.json()}')
         response = c.get(S_URL + reverse('todo:changes-detail', kwargs={'change_id': 2}), headers=self.header1)
         self.assertEqual(response.status_code, 404, msg=f'Change must not be received {response.json()}')
+
+    def test_list_changes_query_count(self):
+        user = User.objects.get(username='test')
+
+        def list_query_count():
+            with CaptureQueriesContext(connection) as ctx:
+                response = c.get(self.api_url, headers=self.header1)
+            self.assertEqual(response.status_code, 200, msg=f'Changes must be listed {response.json()}')
+            return len(ctx.captured_queries), response.json()
+
+        project = Project.objects.create(owner=user, title='p1')
+        tag = Tag.objects.create(owner=user, title='g1')
+        Task.objects.create(owner=user, title='t1', project=project).tags.add(tag)
+        list_query_count()  # the first request also loads the user's flags
+        small, _ = list_query_count()
+
+        for i in range(10):
+            Task.objects.create(owner=user, title=f't{i + 2}', project=project).tags.add(tag)
+        Project.objects.create(owner=user, title='p2').delete()
+        large, data = list_query_count()
+        self.assertEqual(small, large, msg='Change list must use a fixed number of queries')
+        self.assertEqual(data['count'], 26, msg=f'All changes must be listed {data["count"]}')
+        task_changes = [row for row in data['results'] if row['content_type'] == Change.TASK]
+        self.assertEqual(task_changes[0]['content']['tags'], [tag.id], msg='Task content must be hydrated')
+        deleted = [row for row in data['results'] if row['action'] == Change.DELETED]
+        self.assertEqual(deleted[0]['content'], {}, msg='Deleted content must be empty')
+
+    def test_changes_since(self):
+        user = User.objects.get(username='test')
+        for i in range(5):
+            Tag.objects.create(owner=user, title=f'g{i}')
+        url = S_URL + reverse('todo:changes-since', kwargs={'since': 0})
+        response = c.get(url + '?limit=3', headers=self.header1)
+        self.assertEqual(response.status_code, 200, msg=f'Changes must be received {response.json()}')
+        data = response.json()
+        self.assertEqual([row['change_id'] for row in data['results']], [1, 2, 3], msg='First page must be ordered')
+        self.assertTrue(data['has_more'], msg='More changes must be reported')
+        self.assertEqual(data['results'][0]['content']['title'], 'g0', msg='Change content must be hydrated')
+
+        Tag.objects.create(owner=user, title='g5')
+        url = S_URL + reverse('todo:changes-since', kwargs={'since': data['next_since']})
+        data = c.get(url + '?limit=3', headers=self.header1).json()
+        self.assertEqual([row['change_id'] for row in data['results']], [4, 5, 6], msg='Next page must not skip')
+        self.assertFalse(data['has_more'], msg='No more changes must be reported')
+
+        url = S_URL + reverse('todo:changes-since', kwargs={'since': data['next_since']})
+        data = c.get(url, headers=self.header1).json()
+        self.assertEqual(data, {'next_since': 6, 'has_more': False, 'results': []}, msg='Nothing must be changed')
+        url = S_URL + reverse('todo:changes-since', kwargs={'since': 0})
+        data = c.get(url, headers=self.header2).json()
+        self.assertEqual(data['results'], [], msg='Other users changes must not be received')
+
+    def test_compact_changes(self):
+        user = User.objects.get(username='test')
+        task = Task.objects.create(owner=user, title='t1')
+        task.title = 't2'
+        task.save()
+        kept = Tag.objects.create(owner=user, title='g1')
+        removed = Tag.objects.create(owner=user, title='g2')
+        removed_id = removed.id
+        removed.delete()
+        call_command('compact_changes', stdout=StringIO())
+        rows = list(Change.objects.filter(owner=user).order_by('change_id').values_list(
+            'action', 'content_type', 'object_id', 'change_id'))
+        self.assertEqual(rows, [
+            (Change.UPDATED, Change.TASK, str(task.id), 2),
+            (Change.CREATED, Change.TAG, str(kept.id), 3),
+            (Change.DELETED, Change.TAG, str(removed_id), 5),
+        ], msg=f'Only the latest change per object must be kept {rows}')
+
+        call_command('compact_changes', days=-1, stdout=StringIO())
+        self.assertFalse(Change.objects.filter(action=Change.DELETED).exists(), msg='Tombstones must expire')
+        url = S_URL + reverse('todo:changes-since', kwargs={'since': 4})
+        response = c.get(url, headers=self.header1)
+        self.assertEqual(response.status_code, 410, msg=f'Compacted deletions must not be skipped {response.json()}')
+        url = S_URL + reverse('todo:changes-since', kwargs={'since': 5})
+        response = c.get(url, headers=self.header1)
+        self.assertEqual(response.status_code, 200, msg=f'Changes must be received {response.json()}')
+
+    def test_snapshot(self):
+        user = User.objects.get(username='test')
+        tag = Tag.objects.create(owner=user, title='g1')
+        Task.objects.create(owner=user, title='t1').tags.add(tag)
+        Task.objects.create(owner=User.objects.get(username='test2'), title='t2')
+        response = c.get(S_URL + reverse('todo:changes-snapshot'), headers=self.header1)
+        self.assertEqual(response.status_code, 200, msg=f'Snapshot must be received {response.json()}')
+        data = response.json()
+        self.assertEqual(data['watermark'], 3, msg=f'Watermark must be the last change id {data["watermark"]}')
+        self.assertEqual([task['title'] for task in data['tasks']], ['t1'], msg='Only own tasks must be received')
+        self.assertEqual(data['tasks'][0]['tags'], [tag.id], msg='Task tags must be received')
+
+
+# noinspection DuplicatedCode
+class SharedTestCase(TestCase):
+    def setUp(self) -> None:
+        self.api_url = S_URL + reverse("todo:shared-tasks")
+        User.objects.create_user(username='test', password='test')
+        response = c.post(S_URL + reverse("users:token_obtain_pair"), {'username': 'test', 'password': 'test'})
+        self.header1 = {'Authorization': f'Bearer {response.json()["access"]}'}
+        User.objects.create_user(username='test2', password='test2')
+        response = c.post(S_URL + reverse("users:token_obtain_pair"), {'username': 'test2', 'password': 'test2'})
+        self.header2 = {'Authorization': f'Bearer {response.json()["access"]}'}
+
+    def share(self, content_type, object_id):
+        Shared.objects.create(owner=User.objects.get(username='test'), shared_with=User.objects.get(username='test2'),
+                              content_type=content_type, object_id=str(object_id))
+
+    def shared_tasks(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = c.get(self.api_url + '?with-me=true', headers=self.header2)
+        self.assertEqual(response.status_code, 200, msg=f'Shared tasks must be received {response.json()}')
+        return len(ctx.captured_queries), response.json()
+
+    def test_shared_tasks(self):
+        user = User.objects.get(username='test')
+        project = Project.objects.create(owner=user, title='p1')
+        tag = Tag.objects.create(owner=user, title='g1')
+        in_project = Task.objects.create(owner=user, title='t1', project=project)
+        tagged = Task.objects.create(owner=user, title='t2')
+        tagged.tags.add(tag)
+        shared = Task.objects.create(owner=user, title='t3', project=project)
+        shared.tags.add(tag)
+        Task.objects.create(owner=user, title='t4')
+        self.share(Shared.PROJECT, project.id)
+        self.share(Shared.TAG, tag.id)
+        self.share(Shared.TASK, shared.id)
+        self.share(Shared.TASK, 'abc')
+        _, data = self.shared_tasks()
+        self.assertEqual(data['count'], 3, msg=f'Each shared task must be received once {data}')
+        data = c.get(self.api_url, headers=self.header1).json()
+        self.assertEqual(data['count'], 3, msg=f'Non-numeric shares must be skipped {data}')
+        self.assertEqual([task['id'] for task in data['results']], [in_project.id, tagged.id, shared.id],
+                         msg='Shared tasks must be received')
+        data = c.get(self.api_url, headers=self.header2).json()
+        self.assertEqual(data['count'], 0, msg='Tasks shared by other users must not be received')
+
+    def test_shared_tasks_query_count(self):
+        user = User.objects.get(username='test')
+        for i in range(2):
+            self.share(Shared.TASK, Task.objects.create(owner=user, title=f't{i}').id)
+        self.shared_tasks()  # the first request also loads the user's flags
+        small, _ = self.shared_tasks()
+        for i in range(2, 30):
+            project = Project.objects.create(owner=user, title=f'p{i}')
+            tag = Tag.objects.create(owner=user, title=f'g{i}')
+            Task.objects.create(owner=user, title=f't{i}', project=project).tags.add(tag)
+            self.share(Shared.PROJECT, project.id)
+            self.share(Shared.TAG, tag.id)
+        large, data = self.shared_tasks()
+        self.assertEqual(data['count'], 30, msg=f'All shared tasks must be received {data["count"]}')
+        self.assertEqual(small, large, msg='Shared tasks must use a fixed number of queries')
+
+    def test_visibility_index(self):
+        user = User.objects.get(username='test')
+        other = User.objects.get(username='test2')
+        project = Project.objects.create(owner=user, title='p1')
+        tag = Tag.objects.create(owner=user, title='g1')
+        task = Task.objects.create(owner=user, title='t1')
+
+        def visible():
+            return set(TaskVisibility.objects.filter(user=other).values_list('task_id', flat=True))
+
+        self.share(Shared.PROJECT, project.id)
+        self.share(Shared.TAG, tag.id)
+        self.assertEqual(visible(), set(), msg='Unshared task must not be visible')
+        task.project = project
+        task.save()
+        self.assertEqual(visible(), {task.id}, msg='Task must be visible through its project')
+        task.project = None
+        task.save()
+        self.assertEqual(visible(), set(), msg='Task must not be visible after leaving the project')
+        task.tags.add(tag)
+        self.assertEqual(visible(), {task.id}, msg='Task must be visible through its tag')
+        tag.task_set.clear()
+        self.assertEqual(visible(), set(), msg='Task must not be visible after losing the tag')
+        task.tags.add(tag)
+        Shared.objects.filter(content_type=Shared.TAG).delete()
+        self.assertEqual(visible(), set(), msg='Task must not be visible after unsharing')
+
+        self.share(Shared.TASK, task.id)
+        TaskVisibility.objects.all().delete()
+        call_command('rebuild_visibility', stdout=StringIO())
+        self.assertEqual(visible(), {task.id}, msg='Rebuild must restore the index')
+        response = c.get(S_URL + reverse('todo:tasks-detail', kwargs={'pk': task.id}), headers=self.header2)
+        self.assertEqual(response.status_code, 200, msg=f'Shared task must be received {response.json()}')
+        response = c.patch(S_URL + reverse('todo:tasks-detail', kwargs={'pk': task.id}),
+                           json={'title': 't2'}, headers=self.header2)
+        self.assertEqual(response.status_code, 404, msg=f'Shared task must not be updated {response.json()}')
+
+    def test_share_of_other_users_object(self):
+        user, other = User.objects.get(username='test'), User.objects.get(username='test2')
+        task = Task.objects.create(owner=user, title='t1')
+        url = S_URL + reverse('todo:shared-list')
+        for content_type, object_id in ((Shared.TASK, task.id), (Shared.TASK, 'abc')):
+            response = c.post(url, json={'content_type': content_type, 'object_id': str(object_id),
+                                         'shared_with': other.id, 'owner': other.id}, headers=self.header2)
+            self.assertEqual(response.status_code, 400, msg=f'Share must be rejected {response.json()}')
+        Shared.objects.create(owner=other, shared_with=other, content_type=Shared.TASK, object_id=str(task.id))
+        TaskVisibility.objects.refresh_tasks([task.id])
+        self.assertFalse(TaskVisibility.objects.exists(), msg='Share by a non-owner must not make the task visible')
+        call_command('rebuild_visibility', stdout=StringIO())
+        self.assertFalse(TaskVisibility.objects.exists(), msg='Rebuild must skip shares by a non-owner')
+        response = c.get(S_URL + reverse('todo:tasks-detail', kwargs={'pk': task.id}), headers=self.header2)
+        self.assertEqual(response.status_code, 404, msg=f'Task must not be received {response.json()}')
+
+        response = c.post(url, json={'content_type': Shared.TASK, 'object_id': str(task.id),
+                                     'shared_with': other.id, 'owner': other.id}, headers=self.header1)
+        self.assertEqual(response.status_code, 201, msg=f'Share must be created {response.json()}')
+        self.assertEqual(response.json()['owner'], user.id, msg='Share owner must be the requesting user')
+        response = c.get(S_URL + reverse('todo:tasks-detail', kwargs={'pk': task.id}), headers=self.header2)
+        self.assertEqual(response.status_code, 200, msg=f'Shared task must be received {response.json()}')
+
+    def test_delete_user(self):
+        user, other = User.objects.get(username='test'), User.objects.get(username='test2')
+        task = Task.objects.create(owner=user, title='t1')
+        self.share(Shared.TASK, task.id)
+        Shared.objects.create(owner=other, shared_with=user, content_type=Shared.TASK,
+                              object_id=str(Task.objects.create(owner=other, title='t2').id))
+        last_id = Change.objects.get_last_id(other)
+        user.delete()
+        self.assertFalse(TaskVisibility.objects.exists(), msg='Visibility of the deleted user must be removed')
+        self.assertEqual(Change.objects.get_last_id(other), last_id + 1, msg='Unsharing must be recorded')
+
+
+class ReplicaRouterTestCase(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica0'])
+    def test_replica_router(self):
+        router = ReplicaRouter()
+
+        def read_db(method):
+            middleware = replica_middleware(lambda request: router.db_for_read(Task))
+            return middleware(RequestFactory().generic(method, '/api/tasks/'))
+
+        self.assertEqual(read_db('GET'), 'replica0', msg='Safe requests must read from a replica')
+        self.assertEqual(read_db('POST'), 'default', msg='Unsafe requests must read from the primary')
+        self.assertEqual(router.db_for_read(Task), 'default', msg='Reads outside requests must use the primary')
+        self.assertEqual(router.db_for_write(Task), 'default', msg='Writes must go to the primary')
+
+
+class SchedulerTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test', password='test')
+        self.now = timezone.now().replace(microsecond=0)
+        self.reminders = []
+        reminder_due.connect(self.on_reminder)
+
+    def tearDown(self) -> None:
+        reminder_due.disconnect(self.on_reminder)
+
+    def on_reminder(self, sender, tasks, now, **kwargs):
+        self.reminders.extend(task.title for task in tasks)
+
+    def test_scheduler(self):
+        start = self.now
+        task = Task.objects.create(owner=self.user, title='daily', last_occurrence=start - timedelta(minutes=50),
+                                   occurrence_minutes=60, reminder_minutes=5)
+        Task.objects.create(owner=self.user, title='plain')
+        call_command('backfill_schedule', stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.next_fire_at, start + timedelta(minutes=5), msg='Reminder must be scheduled first')
+        with self.assertRaises(CommandError, msg='The scheduler must not push through an in-memory layer'):
+            call_command('run_scheduler', once=True, stdout=StringIO())
+        scheduler = Scheduler(clock=lambda: self.now, horizon=timedelta(minutes=1))
+
+        self.now = start + timedelta(minutes=2)
+        self.assertEqual(scheduler.tick(), 0, msg='Nothing is due yet')
+        self.now = start + timedelta(minutes=6)
+        self.assertEqual(scheduler.tick(), 1, msg='Reminder must fire')
+        task.refresh_from_db()
+        self.assertEqual(self.reminders, ['daily'], msg='Reminder must be sent')
+        self.assertEqual(task.next_fire_at, start + timedelta(minutes=10), msg='Recurrence must be next')
+
+        Task.objects.filter(id=task.id).update(completed=True)
+        TaskCounter.objects.rebuild(self.user)
+        last_id = Change.objects.get_last_id(self.user)
+        self.now = start + timedelta(minutes=128)
+        self.assertEqual(scheduler.tick(), 1, msg='Recurrence must fire')
+        task.refresh_from_db()
+        self.assertEqual(task.last_occurrence, start + timedelta(minutes=70), msg='Task must roll to latest occurrence')
+        self.assertFalse(task.completed, msg='Rolled task must be reopened')
+        self.assertEqual(self.reminders, ['daily'] * 2, msg='Reminder of the new occurrence must fire')
+        self.assertEqual(task.next_fire_at, start + timedelta(minutes=130), msg='Next recurrence must be scheduled')
+        self.assertEqual(Change.objects.get_last_id(self.user), last_id + 1, msg='Roll forward must be recorded')
+        self.assertEqual(TaskCounter.objects.stats(self.user)['completed'], 0, msg='Reopened task must be counted')
+
+    def test_negative_recurrence(self):
+        request = RequestFactory().post('/')
+        request.user = self.user
+        serializer = todo_ss.TaskSerializer(data={'title': 'back', 'occurrence_minutes': -60},
+                                            context={'request': request})
+        self.assertFalse(serializer.is_valid(), msg='Negative recurrences must be rejected')
+        self.assertIn('occurrence_minutes', serializer.errors)
+        task = Task.objects.create(owner=self.user, title='back', last_occurrence=self.now - timedelta(hours=2),
+                                   occurrence_minutes=-60)
+        self.assertIsNone(task.next_fire_at, msg='Negative recurrences must not be scheduled')
+        last_id = Change.objects.get_last_id(self.user)
+        scheduler = Scheduler(clock=lambda: self.now, horizon=timedelta(minutes=1))
+        self.assertEqual(scheduler.tick(), 0, msg='Negative recurrences must not fire')
+        self.assertEqual(scheduler.next_wakeup(), self.now + timedelta(minutes=1), msg='Scheduler must not busy loop')
+        self.assertEqual(Change.objects.get_last_id(self.user), last_id, msg='Nothing must be recorded')
+
+
+class ChangeCounterTestCase(TransactionTestCase):
+    def test_concurrent_change_ids(self):
+        user = User.objects.create_user(username='test', password='test')
+        errors = []
+
+        def write(worker):
+            try:
+                for i in range(10):
+                    tag = Tag.objects.create(owner=user, title=f'{worker}-{i}')
+                    tag.title = f'{worker}-{i}-updated'
+                    tag.save()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [], msg=f'Concurrent writes must not fail: {errors}')
+        change_ids = sorted(Change.objects.filter(owner=user).values_list('change_id', flat=True))
+        self.assertEqual(change_ids, list(range(1, 81)), msg='Change ids must be gap-free')
+        self.assertEqual(ChangeCounter.objects.get(owner=user).last_id, 80, msg='Counter must match last change')
+        self.assertEqual(Change.objects.get_last_id(user), 80, msg='Last id must come from the counter')
+
+
+class ChangePushTestCase(TransactionTestCase):
+    def setUp(self) -> None:
+        self.owner = User.objects.create_user(username='test', password='test')
+        self.other = User.objects.create_user(username='test2', password='test2')
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(application, f'/ws/changes/?token={AccessToken.for_user(user)}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected, msg='Websocket must be connected')
+        return communicator
+
+    async def test_push_changes(self):
+        owner_socket = await self.connect(self.owner)
+        other_socket = await self.connect(self.other)
+        project = await sync_to_async(Project.objects.create)(owner=self.owner, title='p1')
+        message = await owner_socket.receive_json_from()
+        self.assertEqual(message, {'owner': self.owner.id, 'action': Change.CREATED, 'content_type': Change.PROJECT,
+                                   'object_id': str(project.id), 'change_id': 1}, msg='Owner must receive changes')
+        self.assertTrue(await other_socket.receive_nothing(), msg='Unshared changes must not be pushed')
+
+        await sync_to_async(Shared.objects.create)(owner=self.owner, shared_with=self.other,
+                                                   content_type=Shared.PROJECT, object_id=str(project.id))
+        await owner_socket.receive_json_from()
+        task = await sync_to_async(Task.objects.create)(owner=self.owner, title='t1', project=project)
+        message = await other_socket.receive_json_from()
+        self.assertEqual((message['content_type'], message['object_id']), (Change.TASK, str(task.id)),
+                         msg='Changes of shared objects must be pushed')
+
+        def delete_batched(task):
+            with transaction.atomic(), batch_changes():
+                task.delete()
+
+        for delete in (Task.delete, delete_batched):
+            task = await sync_to_async(Task.objects.create)(owner=self.owner, title='t2', project=project)
+            task_id = task.id
+            await other_socket.receive_json_from()
+            await sync_to_async(delete)(task)
+            message = await other_socket.receive_json_from()
+            self.assertEqual((message['action'], message['object_id']), (Change.DELETED, str(task_id)),
+                             msg='Deletes of tasks shared through a project must be pushed')
+        await owner_socket.disconnect()
+        await other_socket.disconnect()
+
+    async def test_skip_foreign_shares(self):
+        other_socket = await self.connect(self.other)
+        project = await sync_to_async(Project.objects.create)(owner=self.owner, title='p1')
+        await sync_to_async(Shared.objects.create)(owner=self.other, shared_with=self.other,
+                                                   content_type=Shared.PROJECT, object_id=str(project.id))
+        await other_socket.receive_json_from()
+        project.title = 'p2'
+        await sync_to_async(project.save)()
+        self.assertTrue(await other_socket.receive_nothing(),
+                        msg='Changes must not be pushed through shares of objects of other users')
+        await other_socket.disconnect()
+
+    async def test_reject_without_token(self):
+        communicator = WebsocketCommunicator(application, '/ws/changes/?token=invalid')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected, msg='Websocket must not be connected')
+
+
+class AccountExportTestCase(TransactionTestCase):
+    async def test_asgi_export(self):
+        user = await sync_to_async(User.objects.create_user)(username='test', password='test')
+        project = await sync_to_async(Project.objects.create)(owner=user, title='p1')
+        for i in range(5):
+            await sync_to_async(Task.objects.create)(owner=user, title=f't{i}', project=project)
+        expected = b''.join(await sync_to_async(list)(transfer.export_lines(user, chunk_size=2)))
+
+        communicator = HttpCommunicator(application, 'GET', reverse('todo:account-export'),
+                                        headers=[(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())])
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output()
+        self.assertEqual(start['status'], 200, msg='Export must succeed through the ASGI application')
+        # the streamed body ends with a message without body, which get_response does not accept
+        body, message = [], {'more_body': True}
+        while message.get('more_body'):
+            message = await communicator.receive_output()
+            body.append(message.get('body', b''))
+        self.assertGreater(len(body), 2, msg='The export must be sent in chunks')
+        self.assertEqual(b''.join(body), expected, msg='The streamed export must match the sync one')
+
+    def test_write_during_export(self):
+        user = User.objects.create_user(username='test', password='test')
+        for i in range(5):
+            Task.objects.create(owner=user, title=f't{i}')
+        lines = transfer.export_lines(user, chunk_size=2)
+        exported = [next(lines), next(lines)]
+        errors = []
+
+        def write():
+            try:
+                Task.objects.create(owner=user, title='written')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        exported.extend(lines)
+        self.assertEqual(errors, [], msg=f'Writes must not wait for an open export: {errors}')
+        titles = [record['title'] for record in map(json.loads, b''.join(exported).splitlines())
+                  if record['type'] == 'task']
+        self.assertEqual(titles, [f't{i}' for i in range(5)], msg='The export must read from one snapshot')
@@ -0,0 +1,312 @@
+import json
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import search
+from .models import (
+    Change, Project, Tag, Task, TaskCounter, current_date_time_validator, current_date_validator,
+)
+from .renderers import FastJSONRenderer
+from .signals import CONTENT_TYPES
+
+FORMAT_VERSION = 1
+TaskTag = Task.tags.through
+
+# record types of an export in the order they are written, with the lookup of their owner and exported columns
+SECTIONS = (
+    ('project', Project, 'owner', (
+        'id', 'title', 'description', 'deadline_date', 'deadline_time', 'created_at', 'updated_at')),
+    ('tag', Tag, 'owner', ('id', 'title')),
+    ('task', Task, 'owner', (
+        'id', 'parent', 'title', 'description', 'deadline_date', 'deadline_time', 'completed', 'occurrence_minutes',
+        'last_occurrence', 'priority', 'reminder_minutes', 'project', 'created_at', 'updated_at')),
+    ('task_tag', TaskTag, 'task__owner', ('task', 'tag')),
+    ('change', Change, 'owner', ('change_id', 'action', 'content_type', 'object_id', 'created_at')),
+)
+FIELDS = {kind: (model, fields) for kind, model, owner, fields in SECTIONS}
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@contextmanager
+def snapshot(using):
+    """A transaction on ``using`` whose reads all see the database as it was at the first one."""
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+        # atomic() begins with the configured transaction_mode, IMMEDIATE takes the write lock for as long as the
+        # export streams; a DEFERRED transaction only holds the WAL snapshot of its first read
+        with connection.cursor() as cursor:
+            cursor.execute('BEGIN DEFERRED')
+        try:
+            yield
+        finally:
+            if connection.connection.in_transaction:
+                with connection.cursor() as cursor:
+                    cursor.execute('COMMIT')
+        return
+    with transaction.atomic(using=using):
+        # MySQL transactions read from one snapshot already, PostgreSQL ones only when asked to
+        if connection.vendor == 'postgresql' and len(connection.atomic_blocks) == 1:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def export_lines(user, chunk_size=None):
+    """
+    Yield the projects, tags, tasks and change history of ``user`` as NDJSON, one chunk of lines per
+    ``chunk_size`` rows read with ``iterator()``, so memory does not grow with the size of the account. All of it
+    is read from one snapshot of one database, so the records refer to each other even while the account changes.
+    """
+    chunk_size = chunk_size or settings.ACCOUNT_TRANSFER_CHUNK_SIZE
+    render = FastJSONRenderer().render
+    using = router.db_for_read(Change)
+    with snapshot(using):
+        yield render({
+            'type': 'account', 'version': FORMAT_VERSION, 'username': user.username,
+            'watermark': Change.objects.db_manager(using).get_last_id(user),
+        }) + b'\n'
+        for kind, model, owner, fields in SECTIONS:
+            rows = model.objects.using(using).filter(**{owner: user}).order_by('pk').values(*fields)
+            for chunk in chunks(rows.iterator(chunk_size=chunk_size), chunk_size):
+                yield b''.join(render({'type': kind, **row}) + b'\n' for row in chunk)
+
+
+async def aexport_lines(user, chunk_size=None):
+    """
+    ``export_lines`` for ASGI responses, which would otherwise collect a sync iterator in one list. The export
+    runs on a thread of its own, so its transaction keeps its connection, and a chunk is only read once the
+    previous one was sent.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+    lines = export_lines(user, chunk_size)
+    pull = sync_to_async(next, thread_sensitive=False, executor=executor)
+    try:
+        while (chunk := await pull(lines, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(close_export, thread_sensitive=False, executor=executor)(lines)
+        executor.shutdown(wait=False)
+
+
+def close_export(lines):
+    lines.close()
+    # the connections of the export thread, nothing else would close them
+    connections.close_all()
+
+
+def update_columns(objs, names):
+    """Like ``bulk_update``, with one executemany of a plain UPDATE instead of a CASE expression per row."""
+    model = type(objs[0])
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in names]
+    sql = (f'UPDATE {quote(model._meta.db_table)} SET {", ".join(f"{quote(field.column)} = %s" for field in fields)} '
+           f'WHERE {quote(model._meta.pk.column)} = %s')
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_value(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+            for obj in objs
+        ])
+
+
+class IdMap:
+    """Exported to imported primary keys, for rows read in ascending exported id order, in two arrays of ints."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.old, self.new = array('q'), array('q')
+
+    def add(self, old, new):
+        if self.old and old <= self.old[-1]:
+            raise ValueError(f'{self.kind} records must be sorted by id')
+        self.old.append(old)
+        self.new.append(new)
+
+    def get(self, old, default=None):
+        index = bisect_left(self.old, old)
+        if index < len(self.old) and self.old[index] == old:
+            return self.new[index]
+        return default
+
+    def __getitem__(self, old):
+        new = self.get(old)
+        if new is None:
+            raise ValueError(f'Unknown {self.kind} id {old}')
+        return new
+
+
+class AccountImporter:
+    """
+    Creates the records of an export under ``user``. Records are buffered per type and written with one
+    ``bulk_create`` per ``batch_size`` rows, and references are remapped through an ``IdMap`` per type. Each
+    imported object gets one CREATED change. The change history of the export is skipped, its ids refer to the
+    exported objects.
+    """
+    timestamps = ('created_at', 'updated_at')
+    skipped_validators = (current_date_validator, current_date_time_validator)
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or settings.ACCOUNT_TRANSFER_CHUNK_SIZE
+        self.now = timezone.now()
+        self.ids = {kind: IdMap(kind) for kind in ('project', 'tag', 'task')}
+        # tasks whose parent was not imported yet when they were written, as (task id, exported parent id)
+        self.orphans = array('q'), array('q')
+        self.counts = {kind: 0 for kind in FIELDS if kind != 'change'}
+        self.kind = None
+        self.pending = []
+        self.started = False
+
+    def feed(self, line):
+        line = line.strip()
+        if not line:
+            return
+        record = json.loads(line)
+        kind = record.pop('type', None) if isinstance(record, dict) else None
+        if not self.started:
+            if kind != 'account' or record.get('version') != FORMAT_VERSION:
+                raise ValueError(f'Expected an account export of version {FORMAT_VERSION}.')
+            self.started = True
+            return
+        if kind == 'change':
+            return
+        if kind not in self.counts:
+            raise ValueError(f'Unknown record type {kind!r}.')
+        if kind != self.kind:
+            self.flush()
+            self.kind = kind
+        self.pending.append(self.values(kind, record))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def finish(self):
+        if not self.started:
+            raise ValueError('The export is empty.')
+        self.flush()
+        tasks = self.ids['task']
+        for chunk in chunks(zip(*self.orphans), self.batch_size):
+            update_columns([Task(id=task_id, parent_id=tasks[parent_id]) for task_id, parent_id in chunk], ['parent'])
+        TaskCounter.objects.rebuild(self.user)
+        return self.counts
+
+    def flush(self):
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        getattr(self, f'create_{self.kind}s')(rows)
+        self.counts[self.kind] += len(rows)
+
+    @classmethod
+    def values(cls, kind, record):
+        model, fields = FIELDS[kind]
+        values = {}
+        for name in fields:
+            field = model._meta.get_field(name)
+            try:
+                values[name] = value = field.to_python(record.get(name))
+                # relations refer to exported ids, they are checked when remapped
+                if not field.is_relation:
+                    field.validate(value, None)
+                    cls.run_validators(field, value)
+            except ValidationError as e:
+                raise ValueError(f'Invalid {kind} {name}: {" ".join(e.messages)}')
+        if 'id' in values and values['id'] is None:
+            raise ValueError(f'A {kind} record has no id.')
+        return values
+
+    @classmethod
+    def run_validators(cls, field, value):
+        # exported deadlines may have passed since, that only matters for new ones
+        if value not in field.empty_values:
+            for validator in field.validators:
+                if validator not in cls.skipped_validators:
+                    validator(value)
+
+    def columns(self, values, exclude=()):
+        return {name: value for name, value in values.items()
+                if name != 'id' and name not in self.timestamps and name not in exclude}
+
+    def create(self, kind, rows, objs):
+        model = type(objs[0])
+        model.objects.bulk_create(objs)
+        for values, obj in zip(rows, objs):
+            self.ids[kind].add(values['id'], obj.pk)
+        Change.objects.record_many(
+            self.user, [(Change.CREATED, CONTENT_TYPES[model], obj.pk) for obj in objs], notify=False)
+        if model in search.SEARCH_MODELS:
+            search.get_backend().index(objs)
+
+    def restore_timestamps(self, rows, objs, fields=()):
+        # bulk_create stamps auto_now and auto_now_add fields with the current time, write the exported ones back
+        for values, obj in zip(rows, objs):
+            for name in self.timestamps:
+                setattr(obj, name, values[name] or self.now)
+        update_columns(objs, [*self.timestamps, *fields])
+
+    @staticmethod
+    def check_titles(kind, model, rows):
+        # titles are unique across accounts, report the first taken one instead of the database error
+        titles = [values['title'] for values in rows]
+        taken = set(model.objects.filter(title__in=titles).values_list('title', flat=True))
+        seen = set()
+        for title in titles:
+            if title in taken or title in seen:
+                raise ValueError(f'The {kind} title {title!r} is already taken.')
+            seen.add(title)
+
+    def create_projects(self, rows):
+        self.check_titles('project', Project, rows)
+        objs = [Project(owner=self.user, **self.columns(values)) for values in rows]
+        self.create('project', rows, objs)
+        self.restore_timestamps(rows, objs)
+
+    def create_tags(self, rows):
+        self.check_titles('tag', Tag, rows)
+        self.create('tag', rows, [Tag(owner=self.user, **self.columns(values)) for values in rows])
+
+    def create_tasks(self, rows):
+        projects, tasks = self.ids['project'], self.ids['task']
+        objs = []
+        for values in rows:
+            task = Task(owner=self.user, **self.columns(values, exclude=('parent', 'project')))
+            task.project_id = None if values['project'] is None else projects[values['project']]
+            task.refresh_schedule(self.now)
+            objs.append(task)
+        self.create('task', rows, objs)
+        # parents are set once the batch has ids, so tasks can refer to earlier rows of the same batch
+        for values, task in zip(rows, objs):
+            if values['parent'] is not None:
+                task.parent_id = tasks.get(values['parent'])
+                if task.parent_id is None:
+                    self.orphans[0].append(task.pk)
+                    self.orphans[1].append(values['parent'])
+        self.restore_timestamps(rows, objs, ['parent'])
+
+    def create_task_tags(self, rows):
+        tasks, tags = self.ids['task'], self.ids['tag']
+        TaskTag.objects.bulk_create([TaskTag(task_id=tasks[values['task']], tag_id=tags[values['tag']])
+                                     for values in rows])
+
+
+def import_lines(user, lines, batch_size=None):
+    """Import the NDJSON ``lines`` of an export into ``user`` in one transaction, returning the rows per type."""
+    importer = AccountImporter(user, batch_size)
+    with transaction.atomic():
+        for line in lines:
+            importer.feed(line)
+        return importer.finish()
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register('projects', views.ProjectViewSet, basename='projects')
@@ -13,5 +13,17 @@ router.register('shared', views.SharedViewSet, basename='shared')
 app_name = 'todo'
 
 urlpatterns = [
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache-stats'),
+    path('stats/', views.StatsView.as_view(), name='stats'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('account/export/', views.AccountExportView.as_view(), name='account-export'),
+    path('account/import/', views.AccountImportView.as_view(), name='account-import'),
+    path('async/projects/', async_views.AsyncProjectView.as_view(), name='async-projects-list'),
+    path('async/projects/<int:pk>/', async_views.AsyncProjectView.as_view(), name='async-projects-detail'),
+    path('async/tags/', async_views.AsyncTagView.as_view(), name='async-tags-list'),
+    path('async/tags/<int:pk>/', async_views.AsyncTagView.as_view(), name='async-tags-detail'),
+    path('async/tasks/', async_views.AsyncTaskView.as_view(), name='async-tasks-list'),
+    path('async/tasks/<int:pk>/', async_views.AsyncTaskView.as_view(), name='async-tasks-detail'),
+    path('async/changes/last_id/', async_views.AsyncLastChangeView.as_view(), name='async-changes-last-id'),
     path('', include(router.urls)),
 ]
@@ -1,25 +1,339 @@
-from rest_framework import viewsets
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction, IntegrityError
+from django.db.models import Q, Value
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_duration
+from django.utils.http import http_date, quote_etag
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Project, Tag, Task, Change, Shared
+from . import cache as response_cache
+from . import search, transfer
+from .filters import TaskFilterSet
+from .models import Project, Tag, Task, TaskCounter, Change, ChangeCounter, Shared, TaskVisibility
+from .signals import CONTENT_TYPES, batch_changes, count_tasks, record_change
 from . import serializers as todo_ss
 
 methods_excluding_put = ['head', 'options', 'get', 'post', 'patch', 'delete']
+SINCE_MAX_LIMIT = 500
+BULK_MAX_OPERATIONS = 1000
+DUE_DEFAULT_WITHIN = timedelta(hours=24)
+
+
+def get_last_change_id(request):
+    if not hasattr(request, 'last_change_id'):
+        request.last_change_id = Change.objects.get_last_id(request.user)
+    return request.last_change_id
+
+
+class ConditionalGetMixin:
+    """
+    Answers conditional GETs with 304 before anything is serialized. Lists are validated by the user's last
+    change id, details by the object's ``updated_at`` when the model has one.
+    """
+
+    def conditional_response(self, etag, last_modified=None):
+        etag = quote_etag(hashlib.md5(etag.encode()).hexdigest())
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        return etag, last_modified, response
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified, response = self.conditional_response(
+            f'{request.user.pk}:{get_last_change_id(request)}:{request.accepted_media_type}:{request.get_full_path()}')
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if not hasattr(queryset.model, 'updated_at'):
+            etag, last_modified, response = self.conditional_response(
+                f'{request.user.pk}:{get_last_change_id(request)}:{request.accepted_media_type}:{request.path}')
+        else:
+            try:
+                updated_at = queryset.filter(pk=kwargs['pk']).values_list('updated_at', flat=True).first()
+            except ValueError:
+                updated_at = None
+            if updated_at is None:
+                return super().retrieve(request, *args, **kwargs)
+            etag, last_modified, response = self.conditional_response(
+                f'{kwargs["pk"]}:{updated_at.isoformat()}:{request.accepted_media_type}', int(updated_at.timestamp()))
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+
+class CachedListMixin:
+    """Serves list responses from the per-user response cache, see ``todo.cache``."""
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache.make_key(request.user.pk, get_last_change_id(request), self.basename,
+                                      request.accepted_media_type, request.get_full_path())
+        data = response_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        response_cache.set(key, response.data)
+        return response
+
+
+class FastReadMixin:
+    """Serves list and retrieve from ``.values()`` rows through ``fast_serializer``."""
+    fast_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        return self.fast_list(self.filter_queryset(self.get_queryset()))
+
+    def fast_list(self, queryset):
+        rows = self.fast_serializer.values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.fast_serializer.serialize(list(rows)))
+        return self.get_paginated_response(self.fast_serializer.serialize(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            rows = list(self.fast_serializer.values(queryset.filter(pk=kwargs['pk'])))
+        except ValueError:
+            rows = []
+        if not rows:
+            raise Http404
+        return Response(self.fast_serializer.serialize(rows)[0])
+
+
+def build_tree(rows):
+    """Nest serialized task rows under their parents in one pass, rows without a loaded parent become roots."""
+    nodes = {row['id']: row for row in rows}
+    roots = []
+    for row in rows:
+        row['children'] = []
+    for row in rows:
+        parent = nodes.get(row['parent'])
+        (roots if parent is None else parent['children']).append(row)
+    return roots
+
+
+class TaskTreeMixin:
+    """
+    Adds ``?tree=1`` to the task list and ``GET tasks/<id>/tree/``, both returning nested ``children``. The list
+    paginates the roots, the listed tasks whose parent is not listed, and loads only the subtrees of a page.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('tree') not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        roots = queryset.exclude(parent__in=queryset).order_by('id').values_list('id', flat=True)
+        page = self.paginate_queryset(roots)
+        root_ids = set(roots if page is None else page)
+        rows = self.fast_serializer.values(queryset.filter(id__in=Task.objects.subtree(root_ids)).order_by('id'))
+        # listed descendants under an unlisted parent are roots of their own, on their own page
+        tree = [node for node in build_tree(self.fast_serializer.serialize(list(rows))) if node['id'] in root_ids]
+        return Response(tree) if page is None else self.get_paginated_response(tree)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def tree(self, request, pk=None):
+        try:
+            queryset = self.get_queryset().filter(id__in=Task.objects.subtree([int(pk)]))
+        except ValueError:
+            raise Http404
+        rows = self.fast_serializer.serialize(list(self.fast_serializer.values(queryset.order_by('id'))))
+        root = next((row for row in build_tree(rows) if row['id'] == int(pk)), None)
+        if root is None:
+            raise Http404
+        return Response(root)
+
+
+class BatchedWriteMixin:
+    """Runs each write in one transaction whose changes are merged per object and recorded in one batch."""
+
+    def perform_create(self, serializer):
+        with transaction.atomic(), batch_changes():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with transaction.atomic(), batch_changes():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(), batch_changes():
+            super().perform_destroy(instance)
+
+
+class BulkModelMixin:
+    """
+    Adds ``POST <list>/bulk/`` taking a list of ``{"op": "create" | "update" | "delete", "id": ..., "data": {...}}``.
+    Every operation is validated first. If any of them fails, nothing is applied and the valid ones report 424.
+    Otherwise all of them are applied in one transaction and their changes are recorded under one contiguous
+    range of change ids.
+    """
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        operations = request.data
+        if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+            raise ValidationError({'detail': 'Expected a list of operations.'})
+        if len(operations) > BULK_MAX_OPERATIONS:
+            raise ValidationError({'detail': f'At most {BULK_MAX_OPERATIONS} operations are allowed.'})
+
+        ids = [operation.get('id') for operation in operations if operation.get('op') in ('update', 'delete')]
+        instances = self.get_queryset().in_bulk([pk for pk in ids if isinstance(pk, int)])
+        results, creates, updates, deletes = [], [], [], []
+        for index, operation in enumerate(operations):
+            op, pk = operation.get('op'), operation.get('id')
+            result = {'index': index, 'op': op}
+            results.append(result)
+            if op not in ('create', 'update', 'delete'):
+                result.update(status=status.HTTP_400_BAD_REQUEST, errors={'op': ['Must be create, update or delete.']})
+                continue
+            if op != 'create' and pk not in instances:
+                result.update(id=pk, status=status.HTTP_404_NOT_FOUND)
+                continue
+            if op == 'delete':
+                result.update(id=pk)
+                deletes.append((result, pk))
+                continue
+            instance = instances.get(pk) if op == 'update' else None
+            serializer = self.get_serializer(instance, data=operation.get('data', {}), partial=op == 'update')
+            if not serializer.is_valid():
+                result.update(id=pk, status=status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+            elif op == 'create':
+                creates.append((result, serializer.validated_data))
+            else:
+                updates.append((result, instance, serializer.validated_data))
+        self.check_unique_in_batch([*creates, *[(result, data) for result, instance, data in updates]])
+        if any('status' in result and result['status'] >= 400 for result in results):
+            for result in results:
+                result.setdefault('status', status.HTTP_424_FAILED_DEPENDENCY)
+            return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic(), batch_changes():
+                self.apply_bulk(creates, updates, deletes)
+        except IntegrityError:
+            # a concurrent write took a unique value after the operations were validated
+            for result in results:
+                if result['op'] == 'create':
+                    result.pop('id', None)
+                result.update(status=status.HTTP_409_CONFLICT,
+                              errors={'non_field_errors': ['Conflicts with a concurrent change, retry the request.']})
+            return Response({'results': results}, status=status.HTTP_409_CONFLICT)
+        return Response({'results': results})
+
+    def check_unique_in_batch(self, writes):
+        """Fail the ``(result, data)`` writes that repeat a unique value of an earlier write of the same batch."""
+        meta = self.get_queryset().model._meta
+        fields = [field for field in meta.fields if field.unique and not field.primary_key]
+        seen = set()
+        for result, data in sorted(writes, key=lambda write: write[0]['index']):
+            errors = {}
+            for field in fields:
+                if field.name in data:
+                    if (field.name, data[field.name]) in seen:
+                        errors[field.name] = [f'{meta.verbose_name} with this {field.verbose_name} already exists.']
+                    seen.add((field.name, data[field.name]))
+            if errors:
+                result.update(status=status.HTTP_400_BAD_REQUEST, errors=errors)
+
+    def apply_bulk(self, creates, updates, deletes):
+        model = self.get_queryset().model
+        content_type = CONTENT_TYPES[model]
+        m2m_fields = model._meta.many_to_many
+        m2m_names = {field.name for field in m2m_fields}
+
+        if model is Task:
+            counted = TaskCounter.objects.keys([instance.pk for result, instance, data in updates])
+        now = timezone.now()
+        created = [model(**{name: value for name, value in data.items() if name not in m2m_names})
+                   for result, data in creates]
+        if model is Task:
+            for instance in created:
+                instance.refresh_schedule(now)
+        model.objects.bulk_create(created)
+        for (result, data), instance in zip(creates, created):
+            result.update(id=instance.pk, status=status.HTTP_201_CREATED)
+            record_change(self.request.user.pk, Change.CREATED, content_type, instance.pk)
+
+        fields = set()
+        for result, instance, data in updates:
+            for name, value in data.items():
+                if name not in m2m_names:
+                    setattr(instance, name, value)
+                    fields.add(name)
+            if hasattr(instance, 'updated_at'):
+                instance.updated_at = now
+                fields.add('updated_at')
+            if model is Task:
+                instance.refresh_schedule(now)
+                fields.update(('next_due_at', 'next_fire_at'))
+            result.update(status=status.HTTP_200_OK)
+            record_change(self.request.user.pk, Change.UPDATED, content_type, instance.pk)
+        if fields:
+            model.objects.bulk_update([instance for result, instance, data in updates], fields)
 
+        written = [(instance, data) for (result, data), instance in zip(creates, created)]
+        written += [(instance, data) for result, instance, data in updates]
+        for field in m2m_fields:
+            through = field.remote_field.through
+            source, target = field.m2m_column_name(), field.m2m_reverse_name()
+            values = [(instance, data[field.name]) for instance, data in written if field.name in data]
+            through.objects.filter(**{f'{source}__in': [instance.pk for instance, related in values]}).delete()
+            through.objects.bulk_create([
+                through(**{source: instance.pk, target: value.pk})
+                for instance, related in values for value in related
+            ])
+        if model is Task:
+            TaskVisibility.objects.refresh_tasks([instance.pk for instance, data in written])
+            deltas = TaskCounter.objects.keys([instance.pk for instance, data in written])
+            deltas.subtract(counted)
+            count_tasks(deltas)
+        if model in search.SEARCH_MODELS:
+            search.get_backend().index([instance for instance, data in written])
+        if deletes:
+            self.get_queryset().filter(pk__in=[pk for result, pk in deletes]).delete()
+            for result, pk in deletes:
+                result.update(status=status.HTTP_204_NO_CONTENT)
 
-class ProjectViewSet(viewsets.ModelViewSet):
+
+class ProjectViewSet(ConditionalGetMixin, CachedListMixin, FastReadMixin, BatchedWriteMixin, BulkModelMixin,
+                     viewsets.ModelViewSet):
     serializer_class = todo_ss.ProjectSerializer
+    fast_serializer = todo_ss.fast_project_serializer
     http_method_names = methods_excluding_put
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         return Project.objects.filter(owner=self.request.user)
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def stats(self, request, pk=None):
+        return Response(TaskCounter.objects.stats(request.user, self.get_object()))
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalGetMixin, CachedListMixin, FastReadMixin, BatchedWriteMixin, BulkModelMixin,
+                 viewsets.ModelViewSet):
     serializer_class = todo_ss.TagSerializer
+    fast_serializer = todo_ss.fast_tag_serializer
     http_method_names = methods_excluding_put
     permission_classes = [IsAuthenticated]
 
@@ -27,14 +341,40 @@ class TagViewSet(viewsets.ModelViewSet):
         return Tag.objects.filter(owner=self.request.user)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ConditionalGetMixin, CachedListMixin, TaskTreeMixin, FastReadMixin, BatchedWriteMixin,
+                  BulkModelMixin, viewsets.ModelViewSet):
     serializer_class = todo_ss.TaskSerializer
+    fast_serializer = todo_ss.fast_task_serializer
     http_method_names = methods_excluding_put
     permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_class = TaskFilterSet
+    search_fields = ('title',)
+    ordering_fields = ('deadline_date', 'priority', 'updated_at', 'created_at', 'title', 'next_due_at')
 
     def get_queryset(self):
+        if self.action in ('retrieve', 'tree'):
+            shared = TaskVisibility.objects.filter(user=self.request.user).values('task_id')
+            return Task.objects.filter(Q(owner=self.request.user) | Q(id__in=shared))
         return Task.objects.filter(owner=self.request.user)
 
+    def pending(self):
+        # compared as a value, SQLite does not use the (owner, completed, next_due_at) index for NOT completed
+        return self.filter_queryset(self.get_queryset()).filter(completed=Value(False)).order_by('next_due_at', 'id')
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def due(self, request):
+        within = request.query_params.get('within')
+        within = DUE_DEFAULT_WITHIN if within is None else parse_duration(within)
+        if within is None or within <= timedelta(0):
+            raise ValidationError({'within': 'Must be a positive duration in seconds, HH:MM:SS or ISO 8601.'})
+        now = timezone.now()
+        return self.fast_list(self.pending().filter(next_due_at__gte=now, next_due_at__lte=now + within))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def overdue(self, request):
+        return self.fast_list(self.pending().filter(next_due_at__lt=timezone.now()))
+
 
 class ChangeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = todo_ss.ChangeSerializer
@@ -45,12 +385,59 @@ class ChangeViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return Change.objects.filter(owner=self.request.user)
 
+    def get_change_data(self, changes):
+        context = self.get_serializer_context()
+        context['contents'] = todo_ss.load_contents(changes)
+        return self.get_serializer_class()(changes, many=True, context=context).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.get_change_data(list(queryset)))
+        return self.get_paginated_response(self.get_change_data(page))
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def last_id(self, request):
         return Response({'last_id': Change.objects.get_last_id(self.request.user)})
 
+    @action(detail=False, methods=['get'], url_path=r'since/(?P<since>\d+)', permission_classes=[IsAuthenticated])
+    def since(self, request, since):
+        since = int(since)
+        if Change.objects.get_last_id(request.user) <= since:
+            return Response({'next_since': since, 'has_more': False, 'results': []})
+        if since and ChangeCounter.objects.filter(owner=request.user, compacted_through__gt=since).exists():
+            return Response({'detail': 'Deletions after this change were compacted, bootstrap from a snapshot.'},
+                            status=status.HTTP_410_GONE)
+        try:
+            limit = int(request.query_params.get('limit', settings.REST_FRAMEWORK['PAGE_SIZE']))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, SINCE_MAX_LIMIT))
+        changes = list(self.get_queryset().filter(change_id__gt=since).order_by('change_id')[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        return Response({
+            'next_since': changes[-1].change_id if changes else since,
+            'has_more': has_more,
+            'results': self.get_change_data(changes),
+        })
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def snapshot(self, request):
+        # read the watermark first, objects changed meanwhile are replayed by the next delta sync
+        watermark = Change.objects.get_last_id(request.user)
+        return Response({
+            'watermark': watermark,
+            'projects': todo_ss.ProjectSerializer(Project.objects.filter(owner=request.user), many=True).data,
+            'tags': todo_ss.TagSerializer(Tag.objects.filter(owner=request.user), many=True).data,
+            'tasks': todo_ss.TaskSerializer(
+                Task.objects.filter(owner=request.user).prefetch_related('tags'), many=True).data,
+            'shared': todo_ss.SharedSerializer(Shared.objects.filter(owner=request.user), many=True).data,
+        })
 
-class SharedViewSet(viewsets.ModelViewSet):
+
+class SharedViewSet(BatchedWriteMixin, viewsets.ModelViewSet):
     serializer_class = todo_ss.SharedSerializer
     http_method_names = methods_excluding_put
     permission_classes = [IsAuthenticated]
@@ -58,25 +445,101 @@ class SharedViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # check queryset with-me
         if self.request.query_params.get('with-me', 'false') == 'true':
-            return Shared.objects.filter(user=self.request.user)
+            return Shared.objects.filter(shared_with=self.request.user)
         return Shared.objects.filter(owner=self.request.user)
 
+    def perform_create(self, serializer):
+        with transaction.atomic(), batch_changes():
+            serializer.save(owner=self.request.user)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def tasks(self, request):
-        tasks = set()
         if request.query_params.get('with-me', 'false') == 'true':
-            queryset = Shared.objects.filter(shared_with=self.request.user)
+            queryset = Task.objects.filter(visibility__user=self.request.user)
         else:
-            queryset = Shared.objects.filter(owner=self.request.user)
-
-        for shared in queryset:
-            if shared.content_type == Shared.PROJECT:
-                tasks.update(Task.objects.filter(project=shared.object_id))
-            elif shared.content_type == Shared.TASK:
-                tasks.add(Task.objects.get(id=shared.object_id))
-            elif shared.content_type == Shared.TAG:
-                tasks.update(Task.objects.filter(tags=shared.object_id))
+            queryset = Task.objects.shared_by(Shared.objects.filter(owner=self.request.user))
+        queryset = queryset.prefetch_related('tags').order_by('id')
+        page = self.paginate_queryset(queryset)
+        context = self.get_serializer_context()
+        if page is None:
+            return Response(todo_ss.TaskSerializer(queryset, many=True, context=context).data)
+        return self.get_paginated_response(todo_ss.TaskSerializer(page, many=True, context=context).data)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
+
+
+class StatsView(APIView):
+    """Task counts of the user: total, completed, overdue, by priority and by tag id."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(TaskCounter.objects.stats(request.user))
+
+
+class SearchView(APIView):
+    """
+    ``GET search/?q=`` ranks the user's tasks and projects by the words of ``q`` in their titles and descriptions,
+    paginated with ``limit`` and ``offset``. The ranking is the search backend's, see ``search.get_backend``.
+    """
+    permission_classes = [IsAuthenticated]
+    fast_serializers = {Change.TASK: todo_ss.fast_task_serializer, Change.PROJECT: todo_ss.fast_project_serializer}
+
+    def get(self, request):
+        terms = search.search_terms(request.query_params.get('q', ''))
+        if not terms:
+            raise ValidationError({'q': 'Must contain at least one word.'})
+        paginator = LimitOffsetPagination()
+        paginator.limit = paginator.get_limit(request)
+        paginator.offset = paginator.get_offset(request)
+        paginator.request = request
+        paginator.count, hits = search.get_backend().search(request.user, terms, paginator.offset, paginator.limit)
+
+        contents = {}
+        for model, content_type in search.SEARCH_MODELS.items():
+            ids = [object_id for hit_type, object_id in hits if hit_type == content_type]
+            if ids:
+                fast_serializer = self.fast_serializers[content_type]
+                rows = list(fast_serializer.values(model.objects.filter(owner=request.user, id__in=ids)))
+                contents.update(((content_type, row['id']), row) for row in fast_serializer.serialize(rows))
         return Response({
-            'count': len(tasks),
-            'results': todo_ss.TaskSerializer(tasks, many=True).data
+            'count': paginator.count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            # hits of objects deleted since the index was read are left out
+            'results': [
+                {'content_type': content_type, 'object_id': object_id, 'content': contents[content_type, object_id]}
+                for content_type, object_id in hits if (content_type, object_id) in contents
+            ],
         })
+
+
+class AccountExportView(APIView):
+    """Streams the user's projects, tags, tasks and change history as NDJSON, see ``transfer.export_lines``."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # ASGI handlers collect sync iterators in one list before sending it, an async one is sent chunk by chunk
+        export_lines = transfer.aexport_lines if isinstance(request._request, ASGIRequest) else transfer.export_lines
+        response = StreamingHttpResponse(export_lines(request.user), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{request.user.username}.ndjson"'
+        return response
+
+
+class AccountImportView(APIView):
+    """Imports an NDJSON export into the user's account, reading the request body line by line."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            counts = transfer.import_lines(request.user, request.stream or [])
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        except IntegrityError:
+            # the known conflicts are reported as ValueError, this one was written concurrently
+            raise ValidationError({'detail': 'The export conflicts with existing data, retry the import.'})
+        return Response(counts, status=status.HTTP_201_CREATED)
@@ -0,0 +1,58 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views import View
+
+from .hashers import amake_password, averify_password
+from .models import User
+from .serializers import TokenObtainPairSerializer, UserSerializer
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+    # a plain dict, serializers read the missing booleans of a QueryDict as unchecked boxes
+    return request.POST.dict()
+
+
+class AsyncSignupView(View):
+    """Creates a user like ``POST users/``, hashing the password on ``users.hashers.executor``."""
+    http_method_names = ['post']
+
+    async def post(self, request):
+        serializer = UserSerializer(data=request_data(request))
+        # validated like the sync view, only the unique username check reads the database
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=400)
+        data = serializer.validated_data
+        user = User(**{name: value for name, value in data.items() if name != 'password'})
+        user.password = await amake_password(data['password'])
+        try:
+            await user.asave(force_insert=True)
+        except IntegrityError:
+            return JsonResponse({'username': ['A user with that username already exists.']}, status=400)
+        return JsonResponse(UserSerializer(user).data, status=201)
+
+
+class AsyncTokenObtainView(View):
+    """Issues a token pair like ``POST token/``, checking the password on ``users.hashers.executor``."""
+    http_method_names = ['post']
+
+    async def post(self, request):
+        data = request_data(request)
+        username, password = (data.get('username'), data.get('password')) if isinstance(data, dict) else (None, None)
+        if not isinstance(username, str) or not isinstance(password, str) or not username or not password:
+            return JsonResponse({'detail': 'Username and password are required.'}, status=400)
+        user = await User.objects.filter(username=username).afirst()
+        if user is None:
+            # hash anyway so response times do not reveal which usernames exist
+            await amake_password(password)
+        elif await averify_password(user, password) and user.is_active:
+            refresh = TokenObtainPairSerializer.get_token(user)
+            return JsonResponse({'refresh': str(refresh), 'access': str(refresh.access_token)})
+        return JsonResponse({'detail': 'No active account found with the given credentials'}, status=401)
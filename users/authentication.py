@@ -0,0 +1,91 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication, default_user_authentication_rule
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import MISSING, TTLCache
+
+User = get_user_model()
+
+# signed into every token by users.serializers.TokenObtainPairSerializer
+USER_CLAIMS = ('username', 'is_active', 'is_staff', 'is_superuser')
+FLAG_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+# current flags and revoke claim of recently seen users, cleared by users.signals when a user is saved or deleted
+user_flags = TTLCache(settings.AUTH_USER_CACHE_TTL)
+
+
+def token_user_id(token):
+    # simplejwt signs ids as strings
+    return User._meta.get_field(api_settings.USER_ID_FIELD).to_python(token[api_settings.USER_ID_CLAIM])
+
+
+def flags_query(user_id):
+    return User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*FLAG_FIELDS, 'password')
+
+
+def cached_flags(row):
+    # the password is only kept as the claim simplejwt signs into tokens to revoke them when it changes
+    return None if row is None else (*row[:-1], get_md5_hash_password(row[-1]))
+
+
+def current_flags(user_id):
+    """
+    The ``FLAG_FIELDS`` of the user followed by its ``REVOKE_TOKEN_CLAIM``, or None if it does not exist, read
+    through ``user_flags``.
+    """
+    flags = user_flags.get(user_id)
+    if flags is MISSING:
+        flags = cached_flags(flags_query(user_id).first())
+        user_flags.set(user_id, flags)
+    return flags
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Builds ``request.user`` from the claims signed into the access token instead of loading the user row on every
+    request. The flags are checked against ``user_flags``, so deactivation, privilege and password changes apply
+    within ``AUTH_USER_CACHE_TTL`` seconds. Tokens issued without the claims fall back to the database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        return self.build_user(validated_token, current_flags(token_user_id(validated_token)))
+
+    async def aget_user(self, validated_token):
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return await sync_to_async(super().get_user)(validated_token)
+        user_id = token_user_id(validated_token)
+        flags = user_flags.get(user_id)
+        if flags is MISSING:
+            flags = cached_flags(await flags_query(user_id).afirst())
+            user_flags.set(user_id, flags)
+        if api_settings.USER_AUTHENTICATION_RULE is default_user_authentication_rule:
+            return self.build_user(validated_token, flags)
+        # other rules may read fields that are not loaded
+        return await sync_to_async(self.build_user)(validated_token, flags)
+
+    @staticmethod
+    def build_user(validated_token, flags):
+        if flags is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not flags[0]:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != flags[-1]:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        values = {api_settings.USER_ID_FIELD: token_user_id(validated_token), 'username': validated_token['username'],
+                  **dict(zip(FLAG_FIELDS, flags))}
+        # unloaded fields are deferred, so they are fetched on access and left alone by save(); from_db takes the
+        # loaded ones in the order of the model fields
+        names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        user = User.from_db(router.db_for_read(User), names, [values[name] for name in names])
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(_('No active account found with the given credentials'),
+                                       code='no_active_account')
+        return user
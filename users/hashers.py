@@ -0,0 +1,36 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# hashing is CPU bound and hashlib releases the GIL, so a few threads keep it off the event loop without starving it
+executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hashing')
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with ``PASSWORD_PBKDF2_ITERATIONS`` rounds. Hashes with another count are upgraded on login."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+
+async def run_hasher(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def amake_password(password):
+    return await run_hasher(hashers.make_password, password)
+
+
+async def averify_password(user, password):
+    """
+    Check ``password`` on the hashing executor and upgrade the stored hash when the hasher profile changed since it
+    was made, like ``User.check_password`` does for sync logins.
+    """
+    is_correct, must_update = await run_hasher(hashers.verify_password, password, user.password)
+    if is_correct and must_update:
+        user.password = await amake_password(password)
+        await type(user).objects.filter(pk=user.pk).aupdate(password=user.password)
+    return is_correct
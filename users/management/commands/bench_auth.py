@@ -0,0 +1,46 @@
+import time
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from users.authentication import StatelessJWTAuthentication
+from users.models import User
+from users.serializers import TokenObtainPairSerializer, TokenVerifySerializer, verified_tokens
+
+
+class Command(BaseCommand):
+    help = ('Compare the per-request latency and queries of JWTAuthentication and StatelessJWTAuthentication, and '
+            'token verification with and without the verification cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(username=f'bench-{uuid4().hex[:12]}')
+        try:
+            token = TokenObtainPairSerializer.get_token(user).access_token
+            request = RequestFactory().get('/api/tasks/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            for authentication in (JWTAuthentication(), StatelessJWTAuthentication()):
+                authentication.authenticate(request)
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    for _ in range(options['requests']):
+                        authentication.authenticate(request)
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(f'{type(authentication).__name__:>26}: {elapsed / options["requests"] * 1e6:7.1f} us '
+                                  f'and {len(ctx.captured_queries) / options["requests"]:.2f} queries per request')
+            for label, serializer_class in (('uncached', jwt_serializers.TokenVerifySerializer),
+                                            ('cached', TokenVerifySerializer)):
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    serializer_class(data={'token': str(token)}).is_valid(raise_exception=True)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{label:>17} verify: {elapsed / options["requests"] * 1e6:7.1f} us per request')
+            self.stdout.write(f'verify cache: {verified_tokens.stats()}')
+        finally:
+            user.delete()
@@ -0,0 +1,52 @@
+import asyncio
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+from django.urls import reverse
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Measure signup and login throughput of the sync and async user endpoints through the ASGI handler at '
+            'several concurrency levels. The users it creates are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--requests', type=int, default=64)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'hasher: {settings.PASSWORD_HASHERS[0]}')
+        prefix = f'bench-{uuid4().hex[:8]}'
+        endpoints = {
+            'sync': (reverse('users:users-list'), reverse('users:token_obtain_pair')),
+            'async': (reverse('users:async_signup'), reverse('users:async_token_obtain_pair')),
+        }
+        try:
+            for concurrency in options['concurrency']:
+                for label, (signup_url, login_url) in endpoints.items():
+                    usernames = [f'{prefix}-{label}-{concurrency}-{i}' for i in range(options['requests'])]
+                    signup = asyncio.run(self.load(signup_url, usernames, concurrency))
+                    login = asyncio.run(self.load(login_url, usernames, concurrency))
+                    self.stdout.write(f'{concurrency:>4} concurrent {label:>5}: signup {signup}, login {login}')
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+
+    @staticmethod
+    async def load(url, usernames, concurrency):
+        client = AsyncClient()
+        pending = iter(usernames)
+        errors = 0
+
+        async def work():
+            nonlocal errors
+            for username in pending:
+                response = await client.post(url, {'username': username, 'password': 'benchmark', 'is_active': True})
+                errors += response.status_code not in (200, 201)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(work() for _ in range(concurrency)))
+        return f'{len(usernames) / (time.perf_counter() - start):6.1f} req/s ({errors} errors)'
@@ -0,0 +1,24 @@
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import StatelessJWTAuthentication
+
+
+async def get_token_user(raw_token):
+    authentication = StatelessJWTAuthentication()
+    try:
+        return await authentication.aget_user(authentication.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Authenticates websocket connections with the access token passed as ``?token=``."""
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        user = await get_token_user(token[0]) if token else AnonymousUser()
+        return await super().__call__(dict(scope, user=user), receive, send)
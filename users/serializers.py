@@ -1,7 +1,21 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 
+from .authentication import FLAG_FIELDS, USER_CLAIMS, StatelessJWTAuthentication, current_flags, token_user_id
+from .cache import MISSING, TTLCache
 from .models import User
 
+# sha256 of tokens that passed verification, each kept until the token expires
+verified_tokens = TTLCache(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds(), settings.TOKEN_VERIFY_CACHE_SIZE)
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,20 +26,63 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        password = validated_data.get('password')
-        user = super().create(validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        validated_data['password'] = make_password(validated_data.get('password'))
+        return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        user = super().update(instance, validated_data)
         if 'password' in validated_data:
-            user.set_password(validated_data['password'])
-            user.save()
-        return user
+            validated_data['password'] = make_password(validated_data['password'])
+        return super().update(instance, validated_data)
 
 
 class AdminUserSerializer(UserSerializer):
     class Meta(UserSerializer.Meta):
         read_only_fields = ('id', 'date_joined')
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Signs the user's name and flags into the tokens for ``StatelessJWTAuthentication``."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Checks the user through ``user_flags`` as ``StatelessJWTAuthentication`` does instead of loading it on every
+    refresh, and signs its current flags into the new access token.
+    """
+
+    def validate(self, attrs):
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            return super().validate(attrs)
+        refresh = self.token_class(attrs['refresh'])
+        if any(claim not in refresh for claim in USER_CLAIMS):
+            return super().validate(attrs)
+        try:
+            user = StatelessJWTAuthentication.build_user(refresh, current_flags(token_user_id(refresh)))
+        except AuthenticationFailed as e:
+            if e.get_codes() == 'password_changed':
+                raise
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        access = refresh.access_token
+        for name in FLAG_FIELDS:
+            access[name] = getattr(user, name)
+        return {'access': str(access)}
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    """Answers tokens that already passed verification from ``verified_tokens`` without checking the signature."""
+
+    def validate(self, attrs):
+        if 'rest_framework_simplejwt.token_blacklist' in settings.INSTALLED_APPS:
+            return super().validate(attrs)
+        key = hashlib.sha256(attrs['token'].encode()).hexdigest()
+        if verified_tokens.get(key) is MISSING:
+            token = UntypedToken(attrs['token'])
+            verified_tokens.set(key, True, ttl=token['exp'] - time.time())
+        return {}
@@ -1,7 +1,16 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import RequestsClient
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import StatelessJWTAuthentication
+from .serializers import TokenObtainPairSerializer, verified_tokens
 
 User = get_user_model()
 
@@ -10,6 +19,10 @@ c = RequestsClient()
 S_URL = "http://testserver"
 
 
+def not_blocked(user):
+    return user.is_active and user.username != 'blocked'
+
+
 class UserTestCase(TestCase):
     def setUp(self) -> None:
         self.api_url = S_URL + reverse("users:users-list")
@@ -44,3 +57,107 @@ class UserTestCase(TestCase):
         self.assertFalse(user.is_active, msg=f'User must be inactive {user.is_active}')
         user.is_active = True
         user.save()
+
+    def test_stateless_authentication(self):
+        c.post(self.api_url, {'username': 'test', 'password': 'test', 'is_active': True})
+        response = c.post(S_URL + reverse("users:token_obtain_pair"), {'username': 'test', 'password': 'test'})
+        access = response.json()['access']
+        self.assertEqual(AccessToken(access)['username'], 'test', msg='Token must carry the user claims')
+        headers = {'Authorization': f'Bearer {access}'}
+        user = User.objects.get(username='test')
+        url = S_URL + reverse("users:users-detail", kwargs={'pk': user.id})
+        c.get(url, headers=headers)
+        with self.assertNumQueries(1):
+            response = c.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200, msg=f'User must be received {response.json()}')
+        token_user = StatelessJWTAuthentication().get_user(AccessToken(access))
+        self.assertEqual((token_user.pk, token_user.username, token_user.is_active, token_user.is_staff,
+                          token_user.is_superuser), (user.pk, 'test', True, False, False),
+                         msg='The user must be built from the claims')
+        user.is_active = False
+        user.save()
+        response = c.get(url, headers=headers)
+        self.assertEqual(response.status_code, 401, msg=f'Inactive user must be rejected {response.json()}')
+        call_command('bench_auth', requests=10, stdout=StringIO())
+
+    def test_stateless_authentication_checks(self):
+        for username in ('test', 'blocked'):
+            c.post(self.api_url, {'username': username, 'password': 'test', 'is_active': True})
+        user = User.objects.get(username='test')
+        url = S_URL + reverse("users:users-detail", kwargs={'pk': user.id})
+        # simplejwt rebinds api_settings when SIMPLE_JWT is overridden, the modules keep the one they imported
+        with mock.patch.multiple(api_settings, CHECK_REVOKE_TOKEN=True, USER_AUTHENTICATION_RULE=not_blocked):
+            tokens = {username: TokenObtainPairSerializer.get_token(User.objects.get(username=username))
+                      for username in ('test', 'blocked')}
+            response = c.get(url, headers={'Authorization': f'Bearer {tokens["test"].access_token}'})
+            self.assertEqual(response.status_code, 200, msg=f'Token must be accepted {response.json()}')
+            response = c.get(url, headers={'Authorization': f'Bearer {tokens["blocked"].access_token}'})
+            self.assertEqual(response.status_code, 401, msg=f'The authentication rule must apply {response.json()}')
+            user.set_password('changed')
+            user.save()
+            response = c.get(url, headers={'Authorization': f'Bearer {tokens["test"].access_token}'})
+            self.assertEqual(response.status_code, 401, msg=f'Password change must revoke tokens {response.json()}')
+            for username, detail in (('test', 'password has been changed'), ('blocked', 'No active account')):
+                response = c.post(S_URL + reverse("users:token_refresh"), {'refresh': str(tokens[username])})
+                self.assertEqual(response.status_code, 401, msg=f'Refresh must apply the same checks {response.json()}')
+                self.assertIn(detail, response.json()['detail'])
+
+    def test_token_cache(self):
+        c.post(self.api_url, {'username': 'test', 'password': 'test', 'is_active': True})
+        response = c.post(S_URL + reverse("users:token_obtain_pair"), {'username': 'test', 'password': 'test'})
+        access, refresh = response.json()['access'], response.json()['refresh']
+        hits = verified_tokens.hits
+        for _ in range(2):
+            response = c.post(S_URL + reverse("users:token_verify"), {'token': access})
+            self.assertEqual(response.status_code, 200, msg=f'Token must be verified {response.json()}')
+        self.assertEqual(verified_tokens.hits, hits + 1, msg='Repeated verification must be cached')
+        response = c.post(S_URL + reverse("users:token_verify"), {'token': access[:-2]})
+        self.assertEqual(response.status_code, 401, msg=f'Tampered token must be rejected {response.json()}')
+
+        response = c.get(S_URL + reverse("users:token_stats"), headers={'Authorization': f'Bearer {access}'})
+        self.assertEqual(response.status_code, 403, msg=f'Stats must be for admins only {response.json()}')
+        User.objects.filter(username='test').update(is_staff=True)
+        User.objects.get(username='test').save()
+        response = c.post(S_URL + reverse("users:token_refresh"), {'refresh': refresh})
+        self.assertTrue(AccessToken(response.json()['access'])['is_staff'], msg='Refresh must sign current flags')
+        response = c.get(S_URL + reverse("users:token_stats"),
+                         headers={'Authorization': f'Bearer {response.json()["access"]}'})
+        self.assertGreater(response.json()['verified_tokens']['hits'], 0,
+                           msg=f'Stats must count hits {response.json()}')
+
+        user = User.objects.get(username='test')
+        user.is_active = False
+        user.save()
+        response = c.post(S_URL + reverse("users:token_refresh"), {'refresh': refresh})
+        self.assertEqual(response.status_code, 401, msg=f'Inactive user must not refresh {response.json()}')
+
+    def test_async_signup_and_login(self):
+        with self.assertNumQueries(2):
+            response = c.post(self.api_url, {'username': 'sync', 'password': 'test'})
+        self.assertEqual(response.status_code, 201, msg=f'User must be created with one write {response.json()}')
+        response = c.post(S_URL + reverse("users:async_signup"), {'username': 'test', 'password': 'test'})
+        self.assertEqual(response.status_code, 201, msg=f'User must be created {response.json()}')
+        self.assertTrue(User.objects.get(username='test').check_password('test'), msg='Password must be hashed')
+        response = c.post(S_URL + reverse("users:async_signup"), json={'username': 'test', 'password': 'test'})
+        self.assertEqual(response.status_code, 400, msg=f'Username must be unique {response.json()}')
+        for data in (['test'], 'test', {'username': 'bad name!!', 'password': 'test'}, {'username': 'u' * 200,
+                     'password': 'test'}, {'username': 'mail', 'password': 'test', 'email': 'notanemail'}):
+            for url in (self.api_url, S_URL + reverse("users:async_signup")):
+                response = c.post(url, json=data)
+                self.assertEqual(response.status_code, 400, msg=f'Invalid signup must be rejected {data} {url}')
+        response = c.post(S_URL + reverse("users:async_signup"), json={'username': 'number', 'password': 5})
+        self.assertEqual(response.status_code, 201, msg=f'Password must be read as text {response.json()}')
+        response = c.post(S_URL + reverse("users:async_token_obtain_pair"), json=['test'])
+        self.assertEqual(response.status_code, 400, msg=f'Non-object login must be rejected {response.json()}')
+        response = c.post(S_URL + reverse("users:async_token_obtain_pair"), json={'username': 'test', 'password': 5})
+        self.assertEqual(response.status_code, 400, msg=f'Non-text password must be rejected {response.json()}')
+
+        response = c.post(S_URL + reverse("users:async_token_obtain_pair"), {'username': 'test', 'password': 'x'})
+        self.assertEqual(response.status_code, 401, msg=f'Wrong password must be rejected {response.json()}')
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            response = c.post(S_URL + reverse("users:async_token_obtain_pair"),
+                              {'username': 'test', 'password': 'test'})
+        self.assertEqual(response.status_code, 200, msg=f'Token must be created {response.json()}')
+        self.assertEqual(AccessToken(response.json()['access'])['username'], 'test', msg='Token must be for the user')
+        password = User.objects.get(username='test').password
+        self.assertTrue(password.startswith('pbkdf2_sha256$1000$'), msg=f'Password must be rehashed {password}')
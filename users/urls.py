@@ -1,8 +1,9 @@
 from django.urls import path, include
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 
-from . import views
+from . import async_views, views
 
 
 router = DefaultRouter()
@@ -14,5 +15,8 @@ urlpatterns = [
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('token/stats/', views.TokenCacheStatsView.as_view(), name='token_stats'),
+    path('async/token/', csrf_exempt(async_views.AsyncTokenObtainView.as_view()), name='async_token_obtain_pair'),
+    path('async/signup/', csrf_exempt(async_views.AsyncSignupView.as_view()), name='async_signup'),
     path('', include(router.urls)),
 ]
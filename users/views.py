@@ -1,7 +1,10 @@
 from rest_framework import viewsets, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from users.authentication import user_flags
 from users.models import User
-from users.serializers import UserSerializer, AdminUserSerializer
+from users.serializers import UserSerializer, AdminUserSerializer, verified_tokens
 
 
 class UserPermission(permissions.BasePermission):
@@ -21,3 +24,10 @@ class UserViewSet(viewsets.ModelViewSet):
         if self.request.user.is_superuser:
             return AdminUserSerializer
         return UserSerializer
+
+
+class TokenCacheStatsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response({'verified_tokens': verified_tokens.stats(), 'user_flags': user_flags.stats()})